@@ -58,6 +58,7 @@ setup(
     entry_points={
         'console_scripts':[
             'yasmine-cli=yasmine_cli.yasmine_cli:main',
+            'yasmine-client=yasmine_cli.yasmine_client:main',
             ],
         },
     include_package_data=True,
@@ -11,6 +11,8 @@ Tests for `yasmine_cli` module.
 import glob
 import os
 import sys
+import tempfile
+import time
 import unittest
 
 from obspy.core.inventory.network import Network
@@ -21,12 +23,16 @@ from obspy import read_inventory
 import yasmine_cli
 
 from yasmine_cli import installation_dir, fdsn_schema_dir, yml_template_dir
-from yasmine_cli.libs.libs_xml import validate_stationxml, get_schema_version
+from yasmine_cli.libs.libs_xml import validate_stationxml, get_schema_version, get_schema, schema_file
+from yasmine_cli.libs.libs_xml import read_xmlfile, validate_xmlfiles, read_stdin, STDIN_NAME
 from yasmine_cli.libs.edit_xml_to_inv import load_xmlfiles, pack_xml_list_to_inv
 from yasmine_cli.libs.libs_obs import _write_stationxml, read_yml_file
 from yasmine_cli.libs.libs_util import configure, processCmdLine
 from yasmine_cli.libs.libs_log import configure_logger
 from yasmine_cli.libs.edit_xml_to_inv import update_root_field, update_field, edit_xml_to_inv
+from yasmine_cli.libs.edit_xml_to_inv import delete_base_node, add_base_node
+from yasmine_cli.libs.libs_index import get_index, compile_pattern
+from yasmine_cli.libs.libs_util import struct
 
 import logging
 logger = logging.getLogger()
@@ -66,6 +72,63 @@ class TestYasmine_cli(unittest.TestCase):
         self.assertEqual(scnl_filter.CHN_EPOCH, 3)
         pass
 
+    def test_process_command_line_patterns(self):
+        sys.argv = ['yasmine-cli', '--level_channel=IU.*.00,--.[EH]H[ZNE]', '--action=select']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        self.assertEqual(args.level, 'channel')
+        self.assertEqual((scnl_filter.NET, scnl_filter.STA), ('IU', None))
+        self.assertEqual((scnl_filter.LOC, scnl_filter.CHA), ('00,--', '[EH]H[ZNE]'))
+
+    def test_batch_operations(self):
+        batch = os.path.join(tempfile.mkdtemp(), 'ops.yml')
+        with open(batch, 'w') as f:
+            f.write("operations:\n"
+                    "  - level_station: '*.ANMO'\n"
+                    "    field: code\n"
+                    "    value: MIKE\n"
+                    "  - level_channel: '*.MIKE.00.BH?'\n"
+                    "    field: azimuth\n"
+                    "    value: 12.0\n"
+                    "  - action: delete\n"
+                    "    level_station: '*.CCM'\n")
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--batch=%s' % batch]
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        self.assertEqual(args.action, 'batch')
+        self.assertEqual([op_args.action for op_args, op_filter in args.batch_ops],
+                         ['update', 'update', 'delete'])
+        inv, schema_version = edit_xml_to_inv(args, scnl_filter)
+        stations = inv.networks[0].stations
+        self.assertEqual({station.code for station in stations}, {'MIKE'})
+        channels = [channel for station in stations for channel in station.channels
+                    if channel.code.startswith('BH')]
+        self.assertTrue(channels)
+        self.assertTrue(all(channel.azimuth == 12.0 for channel in channels))
+
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--batch=%s' % batch, '--field=code']
+        with self.assertRaises(SystemExit):
+            processCmdLine('yasmine-cli')
+
+    def test_code_matcher(self):
+        self.assertIsNone(compile_pattern('*'))
+        self.assertIs(compile_pattern('BH?'), compile_pattern('BH?'))
+        matcher = compile_pattern('00,10')
+        self.assertTrue(matcher.is_literal)
+        self.assertTrue(matcher.match('10'))
+        self.assertFalse(matcher.match('20'))
+        matcher = compile_pattern('[EH]H[ZNE],BH?')
+        self.assertFalse(matcher.is_literal)
+        self.assertEqual([code for code in ['EHZ', 'HHN', 'BH1', 'LHZ', 'HHZ1'] if matcher.match(code)],
+                         ['EHZ', 'HHN', 'BH1'])
+        matcher = compile_pattern('--,0?')
+        self.assertTrue(matcher.match(''))
+        self.assertTrue(matcher.match('00'))
+
+        xml_list = load_xmlfiles(['test_data/Test.xml'])
+        index = get_index(xml_list[0])
+        matches = index.find_channels('IU*', 'ANMO', '00', 'BH?')
+        self.assertEqual(sorted({match[5].code for match in matches}), ['BHE', 'BHN', 'BHZ'])
+        self.assertEqual(len(index.find_channels(None, None, '00', 'BHZ,BHE,BHN')), len(matches))
+
     def test_read_xml_version(self):
         xmlfile = 'test_data/Test.xml'
         schema_version = get_schema_version(xmlfile)
@@ -75,11 +138,669 @@ class TestYasmine_cli(unittest.TestCase):
         valid, errors = validate_stationxml(xmlfile, schema_file)
         self.assertTrue(valid)
 
+    def test_sniff_schema_version(self):
+        xmlfile = 'test_data/Test.xml'
+        with open(xmlfile, 'rb') as f:
+            contents = f.read()
+        self.assertEqual(get_schema_version(contents), '1.0')
+        self.assertEqual(get_schema_version(contents.decode('utf-8')), '1.0')
+        with open(xmlfile, 'rb') as f:
+            self.assertEqual(get_schema_version(f), '1.0')
+            self.assertEqual(f.tell(), 0)
+        # Only the root element is read: the rest of the document is never looked at
+        i = contents.index(b'<Source>')
+        truncated = contents[:i] + b'<<garbage' * 100000
+        self.assertEqual(get_schema_version(truncated), '1.0')
+
+    def test_schema_cache(self):
+        """Validations reuse the compiled schema from the registry"""
+        from lxml import etree
+        from unittest import mock
+        from yasmine_cli.libs import libs_xml
+        xmldoc = etree.parse('test_data/Test.xml')
+        xsd_file = schema_file('1.0')
+
+        # The schema is compiled once, then reused by every validation
+        libs_xml._schema_registry.clear()
+        with mock.patch.object(libs_xml.etree, 'XMLSchema', wraps=libs_xml.etree.XMLSchema) as compile_schema:
+            for i in range(10):
+                valid, errors = validate_stationxml(xmldoc, xsd_file)
+                self.assertTrue(valid)
+        self.assertEqual(compile_schema.call_count, 1)
+        self.assertIs(get_schema('1.0'), get_schema(schemafile=xsd_file))
+
+    def test_validation_report(self):
+        with open('test_data/Test.xml', 'rb') as f:
+            contents = f.read()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bad_file = os.path.join(tmpdir, 'bad.xml')
+            with open(bad_file, 'wb') as f:
+                f.write(contents.replace(b'<Latitude unit="DEGREES">', b'<Latitude unit="DEGREES">X', 1))
+            xmlfiles = [bad_file, 'test_data/Test.xml', 'test_data/AK.xml']
+            # All files are checked against one compiled schema
+            from unittest import mock
+            from yasmine_cli.libs import libs_xml
+            libs_xml._schema_registry.clear()
+            with mock.patch.object(libs_xml.etree, 'XMLSchema', wraps=libs_xml.etree.XMLSchema) as compile_schema:
+                report = validate_xmlfiles(xmlfiles, '1.0')
+            self.assertEqual(compile_schema.call_count, 1)
+            self.assertEqual([result['xmlfile'] for result in report], xmlfiles)
+            self.assertEqual([result['valid'] for result in report], [False, True, True])
+            self.assertTrue(any('Latitude' in error for error in report[0]['errors']))
+            self.assertEqual(report[1]['errors'], [])
+
     def test_load_xml_file(self):
         xmlfile = 'test_data/Test.xml'
         xml_list = load_xmlfiles([xmlfile])
         self.assertIsInstance(xml_list, list)
 
+    def test_lazy_responses(self):
+        import io
+        import pickle
+        from yasmine_cli.libs.libs_obs import LazyResponse
+        eager = pack_xml_list_to_inv(load_xmlfiles(['test_data/Test.xml']))
+        lazy = pack_xml_list_to_inv(load_xmlfiles(['test_data/Test.xml'], lazy_responses=True))
+        responses = [channel.response for station in lazy[0] for channel in station]
+        self.assertTrue(responses)
+        self.assertTrue(all(isinstance(r, LazyResponse) and not r.is_loaded for r in responses))
+
+        # Untouched responses are copied through verbatim
+        lazy.created = eager.created
+        buf_eager, buf_lazy = io.BytesIO(), io.BytesIO()
+        _write_stationxml(eager, buf_eager, validate=True, schema_version='1.0')
+        _write_stationxml(lazy, buf_lazy, validate=True, schema_version='1.0')
+        self.assertEqual(buf_lazy.getvalue(), buf_eager.getvalue())
+        self.assertFalse(any(r.is_loaded for r in responses))
+
+        # ... and only built when used
+        response = pickle.loads(pickle.dumps(responses[0]))
+        self.assertFalse(response.is_loaded)
+        eager_response = [channel.response for station in eager[0] for channel in station][0]
+        self.assertEqual(len(response.response_stages), len(eager_response.response_stages))
+        self.assertTrue(response.is_loaded)
+        self.assertEqual(response, eager_response)
+
+    def test_inventory_cache(self):
+        from yasmine_cli.libs.libs_cache import InventoryCache
+        cache_dir = tempfile.mkdtemp()
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--level_station=*.CCM',
+                    '--field=latitude', '--value=1.5', '--cache_dir=%s' % cache_dir]
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        inv_1, schema_version = edit_xml_to_inv(args, scnl_filter)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        with self.assertLogs(level='INFO') as logs:
+            inv_2, schema_version = edit_xml_to_inv(args, scnl_filter)
+        self.assertIn('Cache hit: test_data/Test.xml', "\n".join(logs.output))
+        self.assertFalse([line for line in logs.output if 'Validation report' in line])
+        inv_2.created = inv_1.created
+        self.assertEqual(inv_1, inv_2)
+
+        # Entries are keyed by load options, --no-cache turns the cache off
+        sys.argv += ['--lazy_responses']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        edit_xml_to_inv(args, scnl_filter)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        args, scnl_filter = processCmdLine('yasmine-cli', argv=sys.argv[1:] + ['--no-cache'])
+        self.assertIsNone(args.inventory_cache)
+
+        # Least recently used entries are evicted beyond max_size
+        cache = InventoryCache(cache_dir, max_size=0)
+        cache.evict()
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_startup_time(self):
+        import subprocess
+        # Import time budget for the cli entry point (python -X importtime, in us)
+        budget = 500000
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import yasmine_cli.yasmine_cli'],
+                              capture_output=True, text=True, check=True)
+        cumulative = {}
+        for line in proc.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                cumulative[fields[2].strip()] = int(fields[1])
+        self.assertLess(cumulative['yasmine_cli.yasmine_cli'], budget)
+        for heavy in ('obspy', 'lxml.etree', 'matplotlib', 'matplotlib.pyplot'):
+            self.assertNotIn(heavy, cumulative)
+
+        # Reading + printing epochs never imports matplotlib
+        code = ("import sys, atexit; sys.argv = ['yasmine-cli', '-p', '--infiles=test_data/Test.xml']; "
+                "atexit.register(lambda: print('matplotlib' in sys.modules, file=sys.stderr)); "
+                "from yasmine_cli.yasmine_cli import main; main()")
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        self.assertIn('[Stn:ANMO]', proc.stdout)
+        self.assertEqual(proc.stderr.splitlines()[-1], 'False')
+
+    def test_plot_responses(self):
+        from yasmine_cli.libs.edit_xml_to_inv import plot_responses, PLOT_MANIFEST
+        plot_dir = tempfile.mkdtemp()
+        inv = read_inventory('test_data/Test.xml')
+        with self.assertLogs(level='INFO') as logs:
+            plot_responses(inv, plot_dir, jobs=2)
+        self.assertIn('3 unique responses for 4 channels', "\n".join(logs.output))
+        pngs = sorted(f for f in os.listdir(plot_dir) if f.endswith('.png'))
+        self.assertEqual(len(pngs), 4)
+        # ANMO BHE + BHN have identical responses --> share one plot
+        links = [f for f in pngs if os.path.islink(os.path.join(plot_dir, f))]
+        self.assertEqual([f[:16] for f in links], ['IUXY.ANMO.BHN.00'])
+        self.assertTrue(os.path.exists(os.path.join(plot_dir, PLOT_MANIFEST)))
+
+        # Only the channel whose response changed (or whose png is missing) is re-plotted
+        station = [sta for sta in inv[0] if sta.channels][0]
+        station.select(channel='BHE')[0].response.instrument_sensitivity.value *= 2
+        os.remove(os.path.join(plot_dir, [png for png in pngs if png.startswith('IUXY.ANMO.HHZ')][0]))
+        with self.assertLogs(level='INFO') as logs:
+            plot_responses(inv, plot_dir, jobs=2)
+        # BHE no longer shares its response with BHN (both re-plotted) + the missing png
+        self.assertIn('4 unique responses for 4 channels', "\n".join(logs.output))
+        self.assertIn('plot 3 responses (1 unchanged plots skipped)', "\n".join(logs.output))
+        self.assertEqual(len([f for f in os.listdir(plot_dir) if f.endswith('.png')]), 4)
+        self.assertFalse([f for f in os.listdir(plot_dir) if os.path.islink(os.path.join(plot_dir, f))])
+
+    def test_polynomial_resp(self):
+        import numpy as np
+        from obspy.core.inventory.response import (Response, ResponseStage, PolynomialResponseStage,
+                                                   InstrumentPolynomial)
+        from yasmine_cli.libs.plot_poly_resp import (evaluate_polynomial_resp, polynomial_gain_mismatch,
+                                                     plot_polynomial_resp)
+        # Temp sensor: T = -40 + 10*V (+ small quadratic), digitized at 1000 counts/V
+        coefficients = [-40., 10., 0.01]
+        gain = 1000.
+        stage = PolynomialResponseStage(1, 1., 0., 'degC', 'V', 0., 0., -30., 50., 0., coefficients)
+        digitizer = ResponseStage(2, gain, 0., 'V', 'COUNTS')
+        instrument = InstrumentPolynomial('degC', 'COUNTS', 0., 0., -30., 50., 0.,
+                                          [c / gain**i for i, c in enumerate(coefficients)])
+        response = Response(instrument_polynomial=instrument, response_stages=[stage, digitizer])
+
+        x1, y1, x2, y2 = evaluate_polynomial_resp(response, dv=0.01)
+        volts = np.arange(-20., 20.001, 0.01)
+        temps = -40. + 10. * volts + 0.01 * volts**2
+        inside = (temps >= -30.) & (temps <= 50.)
+        np.testing.assert_allclose(x1, temps[inside])
+        np.testing.assert_allclose(y1, volts[inside])
+        np.testing.assert_allclose(x2, temps[inside])
+        np.testing.assert_allclose(y2, volts[inside] * gain)
+
+        self.assertLess(polynomial_gain_mismatch(response), 1e-9)
+        digitizer.stage_gain = 2 * gain
+        self.assertGreater(polynomial_gain_mismatch(response), 0.1)
+
+        import matplotlib
+        matplotlib.use('agg')
+        outfile = os.path.join(tempfile.mkdtemp(), 'poly.png')
+        self.assertIsNotNone(plot_polynomial_resp(response, label='XX.TEMP', outfile=outfile))
+        self.assertTrue(os.path.exists(outfile))
+
+    def test_check_responses(self):
+        import csv
+        import numpy as np
+        from yasmine_cli.libs.libs_resp import check_responses, write_report, ResponseEvaluator
+        inv = read_inventory('test_data/IAL_STS-2_RT130.xml')
+        response = inv[0][0][0].response
+        freqs = np.array([0.01, 0.1, 1., 5.])
+        key, h = ResponseEvaluator(freqs).evaluate(response)
+        expected = response.get_evalresp_response_for_frequencies(freqs, output='DEF')
+        np.testing.assert_allclose(np.abs(h), np.abs(expected), rtol=1e-5)
+
+        # All 4 channels share one stage chain: evaluated once
+        inv = read_inventory('test_data/Test.xml')
+        report = check_responses(inv)
+        self.assertEqual((report['channels'], report['unique_chains'], report['flagged']), (4, 1, 0))
+
+        channel = [sta for sta in inv[0] if sta.channels][0].select(channel='BHE')[0]
+        channel.response.response_stages[1].stage_gain *= 2
+        report = check_responses(inv, tolerance=0.01)
+        self.assertEqual((report['unique_chains'], report['flagged']), (2, 1))
+        flagged = [row for row in report['results'] if row['status'] != 'ok'][0]
+        self.assertEqual((flagged['channel'], flagged['status']), ('BHE', 'mismatch'))
+        self.assertAlmostEqual(flagged['rel_error'], 1., places=4)
+
+        outfile = os.path.join(tempfile.mkdtemp(), 'report.csv')
+        write_report(report, outfile)
+        with open(outfile) as fh:
+            rows = list(csv.DictReader(fh))
+        self.assertEqual([row['status'] for row in rows].count('mismatch'), 1)
+
+    def test_merge_inputs(self):
+        tmpdir = tempfile.mkdtemp()
+        inv = read_inventory('test_data/Test.xml').select(station='CCM')
+        xmlfiles = []
+        for i in range(50):
+            inv[0][0].code = 'S%03d' % i
+            xmlfiles.append(os.path.join(tmpdir, 'S%03d.xml' % i))
+            inv.write(xmlfiles[-1], format='stationxml')
+        xml_list = load_xmlfiles(xmlfiles + ['test_data/Test.xml'])
+
+        # One network IUXY holding all station epochs
+        merged = pack_xml_list_to_inv(xml_list)
+        self.assertEqual([net.code for net in merged], ['IUXY'])
+        self.assertEqual(len(merged[0]), 50 + 3)
+
+        # Same station epoch with different contents in 2 files
+        inv[0][0].latitude = 1.5
+        xmlfile = os.path.join(tmpdir, 'S049_lat.xml')
+        inv.write(xmlfile, format='stationxml')
+        xml_list = load_xmlfiles(xmlfiles + [xmlfile])
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertEqual(pack_xml_list_to_inv(xml_list)[0].select(station='S049')[0].latitude, 38.0557)
+        self.assertIn('Merge conflict: Net:IUXY Stn:S049', logs.output[0])
+        self.assertEqual(pack_xml_list_to_inv(xml_list, merge='last-wins')[0].select(station='S049')[0].latitude, 1.5)
+        self.assertEqual(len(pack_xml_list_to_inv(xml_list, merge='last-wins')[0]), 50)
+        with self.assertRaises(SystemExit):
+            pack_xml_list_to_inv(xml_list, merge='error')
+        # .. identical epochs are not a conflict
+        pack_xml_list_to_inv(load_xmlfiles(xmlfiles[:2] + xmlfiles[:2]), merge='error')
+        # .. even when their (--passthrough) input xml is formatted differently
+        with open(xmlfiles[0], 'rb') as f:
+            contents = f.read()
+        reformatted = os.path.join(tmpdir, 'S000_reformatted.xml')
+        with open(reformatted, 'wb') as f:
+            f.write(contents.replace(b'<Latitude', b'  <Latitude').replace(b'<Longitude', b'\t<Longitude'))
+        xml_list = load_xmlfiles([xmlfiles[0], reformatted], passthrough=True)
+        self.assertNotEqual(xml_list[0]['net_codes']['IUXY']['sta_codes']['S000'][0]._raw_xml,
+                            xml_list[1]['net_codes']['IUXY']['sta_codes']['S000'][0]._raw_xml)
+        self.assertEqual(len(pack_xml_list_to_inv(xml_list, merge='error')[0]), 1)
+
+    def test_lazy_epoch_order(self):
+        from yasmine_cli.libs.edit_xml_to_inv import sort_epochs
+        xml_list = load_xmlfiles(['test_data/Test.xml'])
+        stations = [s for s in xml_list[0]['net_codes']['IUXY']['sta_codes']['ANMO']]
+        # A straight parse: epochs kept in input order + no overlap warnings / index built
+        self.assertNotIn('index', xml_list[0])
+        self.assertNotEqual(stations, sorted(stations, key=lambda x: x.start_date))
+
+        get_index(xml_list[0])
+        sort_epochs(xml_list)
+        self.assertNotIn('index', xml_list[0])
+        stations = xml_list[0]['net_codes']['IUXY']['sta_codes']['ANMO']
+        self.assertEqual(stations, sorted(stations, key=lambda x: x.start_date))
+        for station in stations:
+            keys = [(c.location_code, c.code, c.start_date) for c in station.channels]
+            self.assertEqual(keys, sorted(keys))
+
+        # Epoch ordinals still address the sorted epochs
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--level_station=*.ANMO',
+                    '--epoch_station=1', '--action=delete']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        inv_new, schema_version = edit_xml_to_inv(args, scnl_filter)
+        starts = [s.start_date for s in inv_new.select(station='ANMO')[0]]
+        self.assertEqual(starts, [stations[0].start_date])
+
+    def test_audit_epochs(self):
+        import random
+        from yasmine_cli.libs.libs_audit import sweep_epochs, audit_epochs
+        day = 86400 * 10**9
+        epochs = [('XX.STA.00.BHZ', 0, 100 * day, 'A'),
+                  ('XX.STA.00.BHZ', 10 * day, 20 * day, 'B'),       # inside A
+                  ('XX.STA.00.BHZ', 50 * day, 60 * day, 'C'),       # overlaps A (not B)
+                  ('XX.STA.00.BHZ', 110 * day, None, 'D'),          # gap after A
+                  ('XX.STA.00.BHZ', 200 * day, 300 * day, 'E'),     # D is still open
+                  ('XX.STA.00.BHN', 0, 10 * day, 'F'),
+                  ('XX.STA.00.BHN', 10 * day, None, 'G')]           # contiguous: ok
+        findings = sweep_epochs(list(reversed(epochs)), 'channel')
+        self.assertEqual([(f[1], f[3], f[4], f[5]) for f in findings],
+                         [('overlap', 'A', 'B', 10. * 86400), ('overlap', 'A', 'C', 10. * 86400),
+                          ('gap', 'A', 'D', 10. * 86400), ('unclosed', 'D', 'E', None)])
+
+        # 2*10^5 shuffled channel epochs in (well) under 10 s
+        epochs = [('XX.S%05d.00.BHZ' % (i // 10), (i % 10) * day, (i % 10 + 1) * day, None) for i in range(200000)]
+        random.shuffle(epochs)
+        t0 = time.perf_counter()
+        self.assertEqual(sweep_epochs(epochs, 'channel'), [])
+        self.assertLess(time.perf_counter() - t0, 10.)
+
+        report = audit_epochs(read_inventory('test_data/Test.xml'))
+        self.assertEqual((report['summary']['overlaps'], report['summary']['gaps']), (1, 0))
+        self.assertEqual(report['findings'][0]['id'], 'IUXY.ANMO')
+
+    def test_epoch_table(self):
+        from obspy import UTCDateTime
+        from yasmine_cli.libs.libs_epoch import EpochTable, to_ticks
+        t = lambda date: UTCDateTime(date)
+        table = EpochTable.from_epochs([('B', t('2010-01-01'), None, 'b1'),
+                                        ('A', t('2012-01-01'), t('2013-01-01'), 'a2'),
+                                        ('A', t('2011-01-01'), t('2012-06-01'), 'a1'),
+                                        ('A', t('2010-01-01'), t('2010-06-01'), 'a0'),
+                                        ('B', t('2009-01-01'), t('2599-12-31'), 'b0')]).sort()
+        self.assertEqual(table.refs, ['a0', 'a1', 'a2', 'b0', 'b1'])
+        self.assertEqual(table.ordinals().tolist(), [0, 1, 2, 0, 1])
+        self.assertEqual(table.neighbour_overlaps().tolist(), ['', 'overlap', '', 'overlap', ''])
+        self.assertEqual([(finding, table.refs[row1], table.refs[row2]) for finding, row1, row2, seconds in table.sweep()],
+                         [('gap', 'a0', 'a1'), ('overlap', 'a1', 'a2'), ('overlap', 'b0', 'b1')])
+        window = table.window(to_ticks(t('2012-07-01')), to_ticks(t('2012-08-01')))
+        self.assertEqual([ref for ref, keep in zip(table.refs, window) if keep], ['a2', 'b0', 'b1'])
+
+        # Time window filter: update only the BHZ epochs active in 2012
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--level_channel=*.ANMO.*.B*',
+                    '--starttime=2012-01-01', '--field=azimuth', '--value=12.5']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        inv_new, schema_version = edit_xml_to_inv(args, scnl_filter)
+        channels = [channel for station in inv_new.select(station='ANMO')[0] for channel in station]
+        self.assertEqual({c.code: c.azimuth for c in channels if c.azimuth == 12.5}, {'BHZ': 12.5})
+
+        # .. and print only the epochs active within the window (with their full list ordinals)
+        import contextlib
+        import io
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '-p',
+                    '--starttime=2008-06-30T20:05:00', '--endtime=2010-01-01']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), self.assertRaises(SystemExit):
+            edit_xml_to_inv(args, scnl_filter)
+        printed = [line.split(':2')[0].strip() for line in stdout.getvalue().splitlines() if 'epoch[' in line]
+        self.assertEqual(printed, ['[Stn:ANMO] epoch[0]', '[Chn:BHE.00] epoch[0]', '[Chn:BHN.00] epoch[1]',
+                                   '[Stn:ANMO] epoch[1]', '[Stn: CCM] epoch[0]'])
+
+    def test_serve(self):
+        import io
+        import threading
+        from yasmine_cli.libs.libs_serve import serve
+        from yasmine_cli.yasmine_client import send_request
+        socket_path = os.path.join(tempfile.mkdtemp(), 'yasmine-cli.sock')
+        args, scnl_filter = processCmdLine('yasmine-cli serve',
+                                           ['--socket=%s' % socket_path, '--infiles=test_data/Test.xml'])
+        server = threading.Thread(target=serve, args=(args,))
+        server.start()
+        try:
+            for i in range(100):
+                if os.path.exists(socket_path):
+                    break
+                time.sleep(0.05)
+            self.assertTrue(send_request({'command': 'ping'}, socket_path)['ok'])
+
+            # Edits accumulate on the resident inventory
+            response = send_request({'argv': ['--level_station=*.ANMO', '--field=code', '--value=MIKE']}, socket_path)
+            self.assertTrue(response['ok'])
+            response = send_request({'op': {'level_station': '*.MIKE', 'field': 'latitude', 'value': 1.5}},
+                                    socket_path)
+            self.assertTrue(response['ok'])
+            inv = read_inventory(io.BytesIO(response['output'].encode('utf-8')))
+            self.assertEqual([sta.latitude for sta in inv.select(station='MIKE')[0]], [1.5, 1.5])
+
+            response = send_request({'argv': ['-p']}, socket_path)
+            self.assertIn('[Stn:MIKE]', response['stdout'])
+
+            # A bad request is reported back and leaves the server running
+            response = send_request({'argv': ['--level_station=*.MIKE', '--field=foo', '--value=1']}, socket_path)
+            self.assertFalse(response['ok'])
+            self.assertIn('no field/attrib=[foo]', response['errors'][0])
+            response = send_request({'argv': ['--merge=foo']}, socket_path)
+            self.assertFalse(response['ok'])
+            self.assertIn('invalid choice', response['stderr'])
+
+            # .. but ERRORs that yasmine-cli exits 0 on are only reported
+            response = send_request({'argv': ['--level_station=*.NOPE', '--field=latitude', '--value=1']}, socket_path)
+            self.assertTrue(response['ok'])
+            self.assertIn('Update failed', response['errors'][0])
+
+            # A select only narrows down its own output ...
+            response = send_request({'argv': ['--action=select', '--level_station=*.CCM']}, socket_path)
+            self.assertTrue(response['ok'])
+            inv = read_inventory(io.BytesIO(response['output'].encode('utf-8')))
+            self.assertEqual({sta.code for sta in inv[0]}, {'CCM'})
+            # ... the stations outside it are still resident
+            response = send_request({'op': {'level_station': '*.MIKE', 'field': 'latitude', 'value': 2.5}},
+                                    socket_path)
+            self.assertTrue(response['ok'])
+            inv = read_inventory(io.BytesIO(response['output'].encode('utf-8')))
+            self.assertEqual({sta.code for sta in inv[0]}, {'CCM', 'MIKE'})
+
+            # A failed request leaves nothing half applied behind
+            response = send_request({'command': 'edit', 'op': {'batch': 'no_such_file.yml'}}, socket_path)
+            self.assertFalse(response['ok'])
+            response = send_request({'argv': ['--level_station=*.MIKE', '--field=latitude', '--value=3.5',
+                                              '--output=%s' % os.path.join(tempfile.mkdtemp(), 'no', 'such', 'dir.xml')]},
+                                    socket_path)
+            self.assertFalse(response['ok'])
+            response = send_request({'argv': ['--level_station=*.CCM', '--field=longitude', '--value=1']}, socket_path)
+            inv = read_inventory(io.BytesIO(response['output'].encode('utf-8')))
+            self.assertEqual({sta.latitude for sta in inv.select(station='MIKE')[0]}, {2.5})
+
+            # Requests may not change the server's log level
+            import logging
+            level = logging.getLogger().level
+            response = send_request({'argv': ['--level_station=*.CCM', '--field=longitude', '--value=1',
+                                              '--loglevel=DEBUG']}, socket_path)
+            self.assertFalse(response['ok'])
+            self.assertIn('--loglevel', response['errors'][0])
+            self.assertEqual(logging.getLogger().level, level)
+
+            self.assertTrue(send_request({'command': 'reload'}, socket_path)['ok'])
+            self.assertNotIn('[Stn:MIKE]', send_request({'argv': ['-p']}, socket_path)['stdout'])
+        finally:
+            send_request({'command': 'shutdown'}, socket_path)
+            server.join()
+        self.assertFalse(os.path.exists(socket_path))
+
+        # A failed initial load leaves no socket behind
+        args, scnl_filter = processCmdLine('yasmine-cli serve',
+                                           ['--socket=%s' % socket_path, '--infiles=test_data/no_such_file.xml'])
+        with self.assertRaises(SystemExit):
+            serve(args)
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_passthrough(self):
+        import io
+        with open('test_data/Test.xml', 'rb') as f:
+            contents = f.read()
+        start = contents.index(b'<Station code="ANMO" startDate="2008-06-30T20:00:01"')
+        untouched = contents[start:contents.index(b'</Station>', start) + len(b'</Station>')]
+
+        sys.argv = ['yasmine-cli', '--infiles=test_data/Test.xml', '--level_station=*.CCM',
+                    '--field=latitude', '--value=1.5', '--passthrough']
+        args, scnl_filter = processCmdLine('yasmine-cli')
+        inv, schema_version = edit_xml_to_inv(args, scnl_filter)
+        buf = io.BytesIO()
+        _write_stationxml(inv, buf, validate=True, schema_version='1.0')
+        output = buf.getvalue()
+
+        # Untouched station epochs are copied byte for byte, the modified one is re-serialized
+        self.assertIn(untouched, output)
+        self.assertIn(b'<Latitude unit="DEGREES">1.5</Latitude>', output)
+        self.assertTrue(validate_stationxml(io.BytesIO(output), schema_file('1.0'))[0])
+        self.assertEqual(read_inventory(io.BytesIO(output))[0].select(station='CCM')[0].latitude, 1.5)
+
+    def test_streaming_writer(self):
+        import io
+        from obspy.core.util import AttribDict
+        inv = read_inventory('test_data/Test.xml')
+        # Streamed output is byte-identical to obspy's (whole tree) writer
+        expected = io.BytesIO()
+        inv.write(expected, format='stationxml')
+        buf = io.BytesIO()
+        _write_stationxml(inv, buf, validate=True, schema_version='1.1')
+        self.assertEqual(buf.getvalue(),
+                         expected.getvalue().replace(b'schemaVersion="1.2"', b'schemaVersion="1.1"'))
+
+        # .. also with custom namespace attributes/tags on the root element
+        for nsmap in (None, {'yas': 'http://yasmine.org/ns'}):
+            inv.extra = AttribDict({'flag': AttribDict({'value': 'yes', 'namespace': 'http://yasmine.org/ns',
+                                                        'type': 'attribute'}),
+                                    'note': AttribDict({'value': 'hi', 'namespace': 'http://yasmine.org/ns'})})
+            expected = io.BytesIO()
+            inv.write(expected, format='stationxml', nsmap=dict(nsmap) if nsmap else None)
+            buf = io.BytesIO()
+            _write_stationxml(inv, buf, validate=True, schema_version='1.1', nsmap=dict(nsmap) if nsmap else None)
+            self.assertIn(b':flag="yes"', buf.getvalue())
+            self.assertEqual(buf.getvalue(),
+                             expected.getvalue().replace(b'schemaVersion="1.2"', b'schemaVersion="1.1"'))
+
+            # .. and read back with the root's extra attributes/tags + namespaces intact
+            #    (obspy's reader refuses the ns0 prefix its writer makes up without nsmap)
+            if nsmap is None:
+                continue
+            inv_read = read_inventory(io.BytesIO(buf.getvalue()))
+            self.assertEqual({key: (value.value, value.namespace) for key, value in inv_read.extra.items()},
+                             {'flag': ('yes', 'http://yasmine.org/ns'), 'note': ('hi', 'http://yasmine.org/ns')})
+            self.assertEqual(inv_read.extra.flag.type, 'attribute')
+            self.assertEqual(len(inv_read.networks), len(inv.networks))
+        del inv.extra
+
+        # A network that fails (per chunk) validation stops the write + removes the output file
+        inv[0].extra = AttribDict({'Bogus': AttribDict({'value': 'x',
+                                   'namespace': 'http://www.fdsn.org/xml/station/1'})})
+        outfile = os.path.join(tempfile.mkdtemp(), 'out.xml')
+        with self.assertRaises(Exception) as cm:
+            _write_stationxml(inv, outfile, validate=True, schema_version='1.1')
+        self.assertIn('network:IUXY', str(cm.exception))
+        self.assertFalse(os.path.exists(outfile))
+
+    def test_validate_chunk_in_memory(self):
+        from lxml import etree
+        from obspy.io.stationxml.core import _write_network
+        from yasmine_cli.libs.libs_obs import _validate_chunk
+        inv = read_inventory('test_data/Test.xml')
+        parent = etree.Element('FDSNStationXML')
+        _write_network(parent, inv[0], 'response')
+        before = etree.tostring(parent)
+        elements = list(parent)
+        nsmap = {None: 'http://www.fdsn.org/xml/station/1'}
+        valid, errors = _validate_chunk(elements, inv, {'schemaVersion': '1.1'}, nsmap, schema_file('1.1'))
+        self.assertTrue(valid, errors)
+
+        # The (unqualified) tags are restored once validated
+        parent.extend(elements)
+        self.assertEqual(etree.tostring(parent), before)
+
+    def test_read_stdin(self):
+        import io
+        with open('test_data/Test.xml', 'rb') as f:
+            contents = f.read()
+        for max_size in [len(contents) + 1, 1024]:  # In memory / spooled to disk
+            buf = read_stdin(io.BytesIO(contents), max_size=max_size)
+            self.assertEqual(buf._rolled, max_size < len(contents))
+            self.assertEqual(get_schema_version(buf), '1.0')
+            xml_doc = read_xmlfile(buf, name=STDIN_NAME)
+            buf.close()
+            self.assertEqual(xml_doc['xmlfile'], '<stdin>')
+            self.assertEqual(xml_doc['schema_version'], '1.0')
+            valid, errors = validate_stationxml(xml_doc['tree'], schema_file('1.0'))
+            self.assertTrue(valid)
+
+    def test_single_parse_ingest(self):
+        xmlfile = 'test_data/Test.xml'
+        xml_doc = read_xmlfile(xmlfile)
+        self.assertEqual(xml_doc['schema_version'], '1.0')
+        valid, errors = validate_stationxml(xml_doc['tree'], schema_file(xml_doc['schema_version']))
+        self.assertTrue(valid)
+        xml_list = load_xmlfiles([xml_doc])
+        self.assertEqual(xml_list[0]['xmlfile'], xmlfile)
+        inv = pack_xml_list_to_inv(xml_list)
+        ref = read_inventory(xmlfile)
+        self.assertEqual(sorted(inv.get_contents()['channels']), sorted(ref.get_contents()['channels']))
+
+    def test_parallel_load(self):
+        xmlfiles = ['test_data/Test.xml', 'test_data/station.xml', 'test_data/AK.xml']
+        serial = load_xmlfiles(xmlfiles)
+        parallel = load_xmlfiles(xmlfiles, jobs=3)
+        self.assertEqual([x['xmlfile'] for x in parallel], xmlfiles)
+        for xml_dict_1, xml_dict_2 in zip(serial, parallel):
+            self.assertEqual(xml_dict_1.keys(), xml_dict_2.keys())
+            self.assertEqual(list(xml_dict_1['net_codes']), list(xml_dict_2['net_codes']))
+        self.assertEqual(pack_xml_list_to_inv(serial), pack_xml_list_to_inv(parallel))
+
+    def test_parallel_load_validate(self):
+        from unittest import mock
+        from yasmine_cli.libs import libs_xml
+        from yasmine_cli.libs.edit_xml_to_inv import load_validate_xmlfiles
+        xmlfiles = ['test_data/Test.xml', 'test_data/AK.xml']
+        # Each file is parsed once: the tree that is validated is the one loaded
+        get_schema('1.0')
+        with mock.patch.object(libs_xml.etree, 'parse', wraps=libs_xml.etree.parse) as parse:
+            xml_list, report = load_validate_xmlfiles(xmlfiles, '1.0')
+        self.assertEqual([call[0][0] for call in parse.call_args_list], xmlfiles)
+        self.assertEqual([result['valid'] for result in report], [True, True])
+        self.assertEqual(pack_xml_list_to_inv(xml_list), pack_xml_list_to_inv(load_xmlfiles(xmlfiles)))
+
+        with open('test_data/Test.xml', 'rb') as f:
+            contents = f.read()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bad_file = os.path.join(tmpdir, 'bad.xml')
+            with open(bad_file, 'wb') as f:
+                f.write(contents.replace(b'<Latitude unit="DEGREES">', b'<Latitude unit="DEGREES">X', 1))
+            xml_list, report = load_validate_xmlfiles([bad_file] + xmlfiles, '1.0', jobs=3)
+        self.assertIsNone(xml_list)
+        self.assertEqual([result['valid'] for result in report], [False, True, True])
+        self.assertTrue(any('Latitude' in error for error in report[0]['errors']))
+
+    def test_delete_channels_in_place(self):
+        """Channel-level delete on a network with thousands of channel epochs keeps the survivors as they are"""
+        import copy
+        import pickle
+        import tracemalloc
+        from obspy import UTCDateTime
+        from yasmine_cli.libs.edit_xml_to_inv import network_to_dict
+
+        inv = read_inventory('test_data/Test.xml')
+        template = [channel for station in inv[0].stations for channel in station.channels if channel.response][0]
+        response = pickle.dumps(template.response)
+
+        t0 = UTCDateTime(2000, 1, 1)
+        nepochs = 200
+        stations = []
+        for sta_code in ['S1', 'S2']:
+            channels = []
+            for loc in ['00', '10']:
+                for cha in ['BHZ', 'BHN', 'BHE']:
+                    for i in range(nepochs):
+                        channel = copy.copy(template)
+                        channel.code, channel.location_code = cha, loc
+                        channel.start_date = t0 + i * 86400
+                        channel.end_date = t0 + (i + 1) * 86400 - 1
+                        channel.response = pickle.loads(response)
+                        channels.append(channel)
+            stations.append(Station(sta_code, 0., 0., 0., channels=channels, start_date=t0))
+        network = Network('XX', stations=stations, start_date=t0)
+        xml_dict = {'net_codes': {'XX': network_to_dict(network)}}
+        xml_dict['net_codes']['XX']['network'] = network
+
+        keep = [channel for station in stations for channel in station.channels if channel.location_code == '00']
+        scnl_filter = struct(NET='XX', STA=None, LOC='10', CHA=None, STN_EPOCH=None, CHN_EPOCH=None)
+
+        tracemalloc.start()
+        delete_base_node([xml_dict], 'channel', scnl_filter)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        remaining = [channel for station in stations for channel in station.channels]
+        self.assertEqual(len(remaining), len(keep))
+        for channel, kept in zip(remaining, keep):
+            self.assertIs(channel, kept)
+            self.assertIs(channel.response, kept.response)
+        # Deep-copying the stations' channel lists would allocate all 2400 responses
+        self.assertLess(peak, 200 * len(response))
+        self.assertFalse(get_index(xml_dict).find_channels('XX', None, '10', None))
+
+    def test_sncl_index(self):
+        xml_list = load_xmlfiles(['test_data/Test.xml'])
+        index = get_index(xml_list[0])
+        matches = index.find_channels('IUXY', 'ANMO', '00', 'BHZ')
+        self.assertTrue(matches)
+        for (net_code, sta_code, istn, station, ichn, channel) in matches:
+            self.assertIs(xml_list[0]['net_codes'][net_code]['sta_codes'][sta_code][istn].channels[ichn], channel)
+            self.assertEqual((channel.location_code, channel.code), ('00', 'BHZ'))
+        nchannels = len(index.find_channels())
+
+        scnl_filter = struct(NET='IUXY', STA='ANMO', LOC='00', CHA='BHZ', STN_EPOCH=None, CHN_EPOCH=None, INDEX=None)
+        delete_base_node(xml_list, 'channel', scnl_filter)
+        self.assertEqual(index.find_channels('IUXY', 'ANMO', '00', 'BHZ'), [])
+        self.assertEqual(len(index.find_channels()), nchannels - len(matches))
+        # Epoch ordinals are kept in step with station.channels
+        for (net_code, sta_code, istn, station, ichn, channel) in index.find_channels('IUXY', 'ANMO'):
+            self.assertIs(station.channels[ichn], channel)
+
+        channel = test_read_base_node('Channel')
+        scnl_filter = struct(NET='IUXY', STA='ANMO', LOC=None, CHA=None, STN_EPOCH=None, CHN_EPOCH=None, INDEX=None)
+        add_base_node(xml_list, scnl_filter, 'station', channel)
+        matches = index.find_channels(None, None, channel.location_code, channel.code)
+        self.assertEqual([match[5] for match in matches], [channel])
+
+        scnl_filter = struct(NET='IUXY', STA=None, LOC=None, CHA=None, STN_EPOCH=None, CHN_EPOCH=None, INDEX=None)
+        delete_base_node(xml_list, 'network', scnl_filter)
+        self.assertEqual(index.find_stations('IUXY'), [])
+
     def test_convert_xml_list_to_inv(self):
         xmlfile = 'test_data/Test.xml'
         outfile = 'b.xml'
@@ -30,14 +30,17 @@
   #
   # ****************************************************************************/
 
-import copy
+import hashlib
+import json
 import os
-import sys
+import pickle
+import shutil
 from sys import exit
 
-import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
-from obspy import read_inventory
 from obspy.core.inventory.inventory import Inventory
 from obspy.core.inventory.channel import Channel
 from obspy.core.inventory.network import Network
@@ -46,14 +49,16 @@ from obspy.core.inventory.station import Station
 import logging
 logger = logging.getLogger()
 
-from .. import fdsn_schema_dir, installation_dir
+from .. import installation_dir
 
 #from libs.libs_xml import valid_xmlfiles, get_schema_version, check_files
-from .libs_xml import validate_stationxml, get_schema_version, check_files
-from .libs_obs import _write_stationxml
-from .plot_poly_resp import plot_polynomial_resp
-
-import threading
+from .libs_xml import get_schema_version, check_files
+from .libs_xml import read_xmlfile, validate_xmlfiles, log_validation_report
+from .libs_xml import read_stdin, STDIN_NAME
+from .libs_obs import _write_stationxml, _read_stationxml, mark_modified, LazyResponse
+from .libs_index import get_index
+from .libs_epoch import EpochTable
+from .libs_util import MERGE_POLICIES
 
 def edit_xml_to_inv(args, scnl_filter):
     """
@@ -77,39 +82,60 @@ def edit_xml_to_inv(args, scnl_filter):
 
     fname = 'edit_xml_to_inv'
 
-    cleanup_files = []
+    xml_list, schema_version = read_xml_list(args)
+
+    if needs_epoch_order(args):
+        sort_epochs(xml_list)
+
+    if args.print_epochs:
+        print_all(xml_list, args, scnl_filter)
+        exit(2)
+
+    # Perform the action(s)
+    apply_operations(xml_list, args, scnl_filter)
+
+    # Output the modified inventory/stationxml
+    inv_new = pack_xml_list_to_inv(xml_list, merge=args.merge)
+
+    return inv_new, schema_version
+
+def read_xml_list(args):
+    """
+    Read in xml file(s) (args.infiles or stdin), determine schema version and validate against it
+
+    :param args: Determines which files to read and how (--lazy_responses, --passthrough, --cache, --jobs)
+    :type args: class argparse.Namespace
+
+    :returns: List of python dicts containing metadata, one per input file
+    :rtype: list
+
+    :returns: Schema_version (None if --dont_validate)
+    :rtype: string
+    """
+
+    fname = 'read_xml_list'
+
     # Verify all input xml file(s) exist
+    stdin = None
     if args.infiles:
         valid = check_files(args.infiles) # Make sure files exist, are readable, etc.
         if not valid:
             logger.error("One or more xmlfiles could not be read --> STOP EXECUTION")
             exit(2)
+        xmlfiles = args.infiles
     else:
-        read_stdin = True
-        tf = tempfile.NamedTemporaryFile(delete=False)
-        infile = tf.name
-        logger.info("Read from stdin infile=[%s] thread=[%s]" % (infile, threading.get_ident()))
-
-        # How to get version direct from stdin either as file or buffer:
-        #   If you haven't exhausted sys.stdin, you could do:
-        #   schema_version = get_schema_version(sys.stdin)   // read xmlfile to get version
-        #   or, you could parse it and do:
-        #   buf = ""
-        #   for line in sys.stdin:
-               #buf += line
-        #   schema_version = get_schema_version(buf)         // read from xml_string
-        #   schema_version = get_schema_version(infile)      // read from infile
-
-        with open(infile, 'w') as f:
-            for line in sys.stdin:
-                f.write(line)
-        args.infiles = [infile]
-        cleanup_files.append(infile)
-
+        # Read stdin as bytes into memory (spooled to an anonymous temp file only
+        #   above STDIN_SPOOL_SIZE). The buffer is sniffed + parsed directly and closed
+        #   as soon as it has been ingested.
+        stdin = read_stdin()
+        logger.info("Read from stdin: %d bytes" % stdin.seek(0, os.SEEK_END))
+        stdin.seek(0)
+        xmlfiles = [stdin]
 
     # Verify all file(s) have same stationxml schema version:
+    #   (get_schema_version only reads up to the root element)
     versions = []
-    for xmlfile in args.infiles:
+    for xmlfile in xmlfiles:
         versions.append(get_schema_version(xmlfile))
     if len(set(versions)) > 1:
         logger.error("Input files have different schema versions --> Exit")
@@ -119,49 +145,133 @@ def edit_xml_to_inv(args, scnl_filter):
     #          where schema version = --args.schema_version (if set)  *or* schema version of input files
     schema_version = None
     if not args.dont_validate:           # Check for valid StationXML
-        valid = True
-        for xmlfile in args.infiles:
-            schema_version = get_schema_version(xmlfile)
-            logger.info("Input schema_version=%s" % schema_version)
-            if args.schema_version:
-                logger.info("Input files version:[%s] --> Request output version:[%s]" % \
-                            (schema_version, args.schema_version))
-                schema_version = args.schema_version
-
-            schema_file = os.path.join(fdsn_schema_dir(), 'fdsn-station-%s.xsd' % schema_version)
-            logger.info("Check file:%s against schema_file:%s" % (xmlfile, schema_file))
-            valid, errors = validate_stationxml(xmlfile, schema_file)
-
-            if not valid:
-                for error in errors:
-                    logger.error(error)
-                logger.error("File:%s does not validate against schema version:[%s]" % \
-                            (xmlfile, schema_version))
-
-        if not valid:
+        schema_version = versions[0]
+        logger.info("Input schema_version=%s" % schema_version)
+        if args.schema_version:
+            logger.info("Input files version:[%s] --> Request output version:[%s]" % \
+                        (schema_version, args.schema_version))
+            schema_version = args.schema_version
+
+    # --passthrough: untouched networks/stations are copied from the input xml to output.
+    #                Only possible if the output is the same schema version as the input
+    passthrough = args.passthrough
+    if passthrough and args.schema_version and args.schema_version != versions[0]:
+        logger.warning("--passthrough ignored: output schema_version=%s != input schema_version=%s" %
+                       (args.schema_version, versions[0]))
+        passthrough = False
+
+    # --cache: files already loaded (+ validated against schema_version) by an earlier run
+    #          are read from the cache and skip parsing + validation entirely
+    cache = getattr(args, 'inventory_cache', None)
+    cache_keys = {}
+    cached = {}
+    if cache is not None and stdin is None:
+        for i, (xmlfile, version) in enumerate(zip(xmlfiles, versions)):
+            cache_keys[i] = cache.key(xmlfile, version, lazy_responses=args.lazy_responses,
+                                      passthrough=passthrough)
+            xml_dict = cache.get(cache_keys[i], validated=schema_version)
+            if xml_dict is not None:
+                logger.info("Cache hit: %s" % xmlfile)
+                xml_dict['xmlfile'] = xmlfile
+                cached[i] = xml_dict
+    todo = [i for i in range(len(xmlfiles)) if i not in cached]
+    todo_files = [xmlfiles[i] for i in todo]
+
+    # --jobs N: parse + validate + network_to_dict input files across N worker processes
+    jobs = 1 if args.serial else args.jobs
+    parallel_load = jobs != 1 and len(todo_files) > 1
+
+    # Ingest: parse each input file exactly once. The resulting lxml tree is
+    #         used for validation and building the Inventory
+    #         (unless the files are loaded in parallel: then each worker parses,
+    #          validates + loads its own file)
+    xml_docs = []
+    if not parallel_load:
+        for i in todo:
+            xmlfile = xmlfiles[i]
+            name = STDIN_NAME if xmlfile is stdin else None
+            xml_doc = read_xmlfile(xmlfile, schema_version=versions[i], name=name)
+            if xml_doc is None:
+                logger.error("Unable to parse xmlfile:%s --> STOP EXECUTION" % (name if name else xmlfile))
+                exit(2)
+            xml_docs.append(xml_doc)
+        if stdin is not None:
+            stdin.close()
+
+    if schema_version and xml_docs:
+        # All files are validated before we decide to stop
+        report = validate_xmlfiles(xml_docs, schema_version)
+        if not log_validation_report(report):
             logger.error("One or more xmlfiles are NOT valid StationXML --> STOP EXECUTION")
             exit(2)
 
     # Read all input xml
-    xml_list = load_xmlfiles(args.infiles)
+    if not todo:
+        loaded = []
+    elif parallel_load and schema_version:
+        # lxml trees can't be sent to worker processes --> workers parse + validate + load from path
+        loaded, report = load_validate_xmlfiles(todo_files, schema_version, jobs=jobs,
+                                                lazy_responses=args.lazy_responses, passthrough=passthrough)
+        if not log_validation_report(report):
+            logger.error("One or more xmlfiles are NOT valid StationXML --> STOP EXECUTION")
+            exit(2)
+    elif parallel_load:
+        loaded = load_xmlfiles(todo_files, jobs=jobs, lazy_responses=args.lazy_responses,
+                               passthrough=passthrough)
+    else:
+        loaded = load_xmlfiles(xml_docs, lazy_responses=args.lazy_responses, passthrough=passthrough)
+        del xml_docs
 
-    '''
-    for tmpfile in cleanup_files:
-        try:
-            os.remove(tmpfile)
-        except:
-            raise
-    '''
+    xml_list = None
+    if loaded is not None:
+        for i, xml_dict in zip(todo, loaded):
+            if i in cache_keys:
+                cache.put(cache_keys[i], xml_dict, validated=schema_version)
+        loaded = dict(zip(todo, loaded))
+        xml_list = [cached[i] if i in cached else loaded[i] for i in range(len(xmlfiles))]
 
     if not xml_list:
         logger.error("No xml files loaded --> exit")
         exit(2)
 
-    if args.print_epochs:
-        print_all(xml_list, args)
-        exit(2)
+    return xml_list, schema_version
+
+def apply_operations(xml_list, args, scnl_filter):
+    """
+    Perform the action set on the cmd line -or- each of the --batch operations in order
+
+    :param xml_list: List of python dicts containing metadata
+    :type xml_list: list
+
+    :param args: args.action (or args.batch_ops if args.action == 'batch')
+    :type args: class argparse.Namespace
+
+    :param scnl_filter: Filter that determines level (network, station, channel) at which to
+                        apply modifications
+    :type scnl_filter: Simple python struct for holding attributes
+    """
+    if args.action == 'batch':
+        for i, (op_args, op_filter) in enumerate(args.batch_ops):
+            logger.info("Batch operation[%d]: level=[%s] action=[%s]" % (i, op_args.level, op_args.action))
+            apply_operation(xml_list, op_args, op_filter)
+    else:
+        apply_operation(xml_list, args, scnl_filter)
+
+def apply_operation(xml_list, args, scnl_filter):
+    """
+    Perform one action (update/add/delete/select) on the metadata in xml_list
+
+    :param xml_list: List of python dicts containing metadata
+    :type xml_list: list
+
+    :param args: Determines what modifications to make to input metadata
+    :type args: class argparse.Namespace
+
+    :param scnl_filter: Filter that determines level (network, station, channel) at which to
+                        apply modifications
+    :type scnl_filter: Simple python struct for holding attributes
+    """
 
-    # Perform the action
     if args.action == 'delete':
         delete_base_node(xml_list, args.level, scnl_filter)
     elif args.action == 'add':
@@ -181,25 +291,35 @@ def edit_xml_to_inv(args, scnl_filter):
         filter_xml(xml_list, scnl_filter)
         #exit()
 
-    # Output the modified inventory/stationxml
-    inv_new = pack_xml_list_to_inv(xml_list)
-
-    return inv_new, schema_version
+    return
 
-#import matplotlib
-#matplotlib.use('TkAgg')
-#matplotlib.use('agg')
-import matplotlib.pyplot as plt
+PLOT_MANIFEST = '.yasmine-plots.json'
+PLOT_MIN_FREQ = .001
 
-def plot_responses(inventory, plot_dir):
+def plot_responses(inventory, plot_dir, jobs=1):
     """
         Loop over channels in inventory, create response plot for each
             channel and save to file in plot_dir
         Response may be 'normal' (= use obspy response.plot()) or
             polynomial (= use plot_polynomial_response() to generate fig)
 
+        Channels with identical responses share one plot: each unique response is rendered once
+            and the other channels' pngs are symlinks to (or copies of) it.
+        Plots that already exist in plot_dir, and whose response hash is unchanged
+            since they were plotted (recorded in plot_dir/PLOT_MANIFEST), are skipped.
+        The remaining plots are rendered with the (headless) Agg backend across jobs worker processes
+
+    :param inventory: Inventory whose channel responses to plot
+    :type inventory: obspy.core.inventory.inventory
 
+    :param plot_dir: Path to dir to save plot responses [default=cwd]
+    :type plot_dir: str
+
+    :param jobs: Number of worker processes to plot with
+                 [default=1 = serial, 0 or None = one per cpu]
+    :type jobs: int
     """
+
     if plot_dir is None:
         plot_dir = "."
 
@@ -211,13 +331,21 @@ def plot_responses(inventory, plot_dir):
                 logger.error("Can't create plot_dir: %s --> Check permissions" % (plot_dir))
                 exit(2)
 
-    level=logger.level
-    logger.setLevel(30)
-
-    min_freq = .001
-
     logger.info("plot_responses: plot_dir=[%s]" % plot_dir)
 
+    manifest_file = os.path.join(plot_dir, PLOT_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r') as fh:
+                manifest = json.load(fh)
+        except (IOError, ValueError) as e:
+            logger.warning("plot_responses: ignore unreadable %s: %r" % (manifest_file, e))
+
+    # Channels that share the same response (+ sampling rate) share one plot:
+    #   it is rendered once, for the first such channel, and linked to by the others
+    groups = {}
+    nchannels = 0
     for network in inventory.networks:
         for station in network.stations:
             for channel in station.channels:
@@ -234,24 +362,131 @@ def plot_responses(inventory, plot_dir):
                 outfile = label + ".png"
                 outfile = os.path.join(plot_dir, outfile)
 
-                if channel.response.instrument_polynomial:
-                    #logger.warning("%s.%s.%s.%s has instrument_polynomial: "
-                                #"Polynomial response plot not yet supported" %
-                                #(network.code, station.code, channel.code, channel.location_code))
-                    label += "\npolynomial response"
-                    fig = plot_polynomial_resp(channel.response, label=label,
-                                               axes=None, outfile=outfile)
+                key = response_hash(channel.response, sampling_rate, PLOT_MIN_FREQ)
+                groups.setdefault(key, []).append((channel.response, label, outfile, sampling_rate))
+                nchannels += 1
+
+    logger.info("plot_responses: %d unique responses for %d channels" % (len(groups), nchannels))
+
+    tasks = []
+    shared = []
+    for key, channels in groups.items():
+        response, label, outfile, sampling_rate = channels[0]
+        if len(channels) > 1:
+            label += "\n(same response for %d channels)" % len(channels)
+        digest = hashlib.sha256((key + label).encode('utf-8')).hexdigest()
+        if not os.path.exists(outfile) or manifest.get(os.path.basename(outfile)) != digest:
+            if os.path.islink(outfile):     # Used to share another channel's plot: don't write through it
+                os.remove(outfile)
+            tasks.append((response, label, outfile, sampling_rate, digest))
+        for other in channels[1:]:
+            shared.append((other[2], outfile, digest))
+
+    if not jobs:
+        jobs = os.cpu_count()
+    jobs = min(jobs, len(tasks))
+    logger.info("plot_responses: plot %d responses (%d unchanged plots skipped) with %d worker processes" %
+                (len(tasks), len(groups) - len(tasks), max(jobs, 1)))
 
-                else:
-                    fig = channel.response.plot(min_freq, output="VEL", unwrap_phase=False,
-                                                sampling_rate=sampling_rate, label=label,
-                                                outfile=outfile)
-                    plt.close(fig)
+    level=logger.level
+    logger.setLevel(30)
 
-    logger.setLevel(level)
+    try:
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                errors = list(executor.map(_plot_response, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+        else:
+            errors = [_plot_response(task) for task in tasks]
+    finally:
+        logger.setLevel(level)
+
+    failed = set()
+    for (response, label, outfile, sampling_rate, digest), error in zip(tasks, errors):
+        if error:
+            logger.error("plot_responses: unable to plot %s: %s" % (label, error))
+            manifest.pop(os.path.basename(outfile), None)
+            failed.add(outfile)
+        else:
+            manifest[os.path.basename(outfile)] = digest
+
+    for outfile, plotfile, digest in shared:
+        if plotfile in failed:
+            manifest.pop(os.path.basename(outfile), None)
+            continue
+        if os.path.lexists(outfile) and manifest.get(os.path.basename(outfile)) == digest:
+            continue
+        _share_plot(plotfile, outfile)
+        manifest[os.path.basename(outfile)] = digest
+
+    try:
+        with open(manifest_file, 'w') as fh:
+            json.dump(manifest, fh, indent=1, sort_keys=True)
+    except IOError as e:
+        logger.warning("plot_responses: unable to write %s: %r" % (manifest_file, e))
 
     return
 
+
+def _share_plot(plotfile, outfile):
+    """
+    Make outfile a (relative) symlink to plotfile in the same plot_dir -or- a copy where symlinks aren't possible
+    """
+    if os.path.lexists(outfile):
+        os.remove(outfile)
+    try:
+        os.symlink(os.path.basename(plotfile), outfile)
+    except OSError:
+        shutil.copyfile(plotfile, outfile)
+
+
+def response_hash(response, *args):
+    """
+    Hash of a channel response (+ any other plot inputs in args), used to find channels that
+        share identical responses and to tell if a plot is stale.
+        A LazyResponse hashes the same as the Response it loads to
+
+    :returns: hex digest
+    :rtype: str
+    """
+    if isinstance(response, LazyResponse):
+        response._load()
+    return hashlib.sha256(pickle.dumps((response.__dict__,) + args, protocol=4)).hexdigest()
+
+
+def _plot_response(task):
+    """
+    Plot one channel response to its png
+        Runs in a worker process when plot_responses is called with jobs > 1
+
+    :param task: (response, label, outfile, sampling_rate, digest)
+    :type task: tuple
+
+    :returns: None -or- error message if the plot failed
+    :rtype: str
+    """
+    # matplotlib is only imported when plotting: it dominates the startup time of every other call
+    #   Only files are written --> always use the headless Agg backend
+    import matplotlib
+    matplotlib.use('agg')
+    import matplotlib.pyplot as plt
+    from .plot_poly_resp import plot_polynomial_resp
+
+    response, label, outfile, sampling_rate = task[:4]
+    try:
+        if response.instrument_polynomial:
+            label += "\npolynomial response"
+            fig = plot_polynomial_resp(response, label=label, axes=None, outfile=outfile)
+        else:
+            fig = response.plot(PLOT_MIN_FREQ, output="VEL", unwrap_phase=False,
+                                sampling_rate=sampling_rate, label=label,
+                                outfile=outfile)
+        if fig is not None:
+            plt.close(fig)
+    except Exception as e:
+        return repr(e)
+
+    return None
+
 def filter_xml(xml_list, scnl_filter):
     """
     Filter (remove) elements defined in scnl_filter from xml_list
@@ -265,72 +500,111 @@ def filter_xml(xml_list, scnl_filter):
 
     """
 
-    if scnl_filter.NET:
-        for xml_dict in xml_list:
-            # Need to keep static copy of the keys to avoid 
+    for xml_dict in xml_list:
+        index = get_index(xml_dict)
+
+        if scnl_filter.NET:
+            kept = set(index.find_networks(scnl_filter.NET))
+            # Need to keep static copy of the keys to avoid
             #  RuntimeError: dictionary changed size during iteration:
-            for net_code in xml_dict['net_codes'].copy():
-                if net_code != scnl_filter.NET:
-                    try:
-                        logger.info("Ignore network=%s" % net_code)
-                        xml_dict['net_codes'].pop(net_code)
-                    except KeyError:
-                        logger.error("Key not found:%s" % net_code)
+            for net_code in list(xml_dict['net_codes']):
+                if net_code not in kept:
+                    logger.info("Ignore network=%s" % net_code)
+                    xml_dict['net_codes'].pop(net_code)
+                    index.remove_network(net_code)
                 else:
                     logger.info("Net:%s passed filter" % net_code)
 
-    if scnl_filter.STA:
-        for xml_dict in xml_list:
+        if scnl_filter.STA:
+            kept = set(index.find_stations(None, scnl_filter.STA))
             for net_code, net_dict in xml_dict['net_codes'].items():
                 # list also makes copy of the keys:
                 for sta_code in list(net_dict['sta_codes'].keys()):
-                    if sta_code != scnl_filter.STA:
-                        try:
-                            logger.info("Ignore station=%s" % sta_code)
-                            net_dict['sta_codes'].pop(sta_code)
-                        except KeyError:
-                            logger.error("Key not found:%s" % sta_code)
+                    if (net_code, sta_code) not in kept:
+                        logger.info("Ignore station=%s" % sta_code)
+                        net_dict['sta_codes'].pop(sta_code)
+                        index.remove_station(net_code, sta_code)
                     else:
                         logger.info("Sta:%s passed filter" % sta_code)
 
-    # At this point you've already filtered net_dict down by NET.STA
+        # At this point you've already filtered net_dict down by NET.STA
 
-    # CHA can be name or *.  LOC can be XX or * or '' (no location)
-    if scnl_filter.CHA or scnl_filter.LOC is not None:
-        for xml_dict in xml_list:
-            #print(xml_dict)
-            for net_code, net_dict in xml_dict['net_codes'].items():
+        # CHA can be name or *.  LOC can be XX or * or '' (no location)
+        if scnl_filter.CHA or scnl_filter.LOC is not None:
+            matches = index.find_channels(None, None, scnl_filter.LOC, scnl_filter.CHA)
 
-                new_dict = {}
-                new_dict['sta_codes'] = {}
-                new_dict['network'] = net_dict['network']
+            # station epoch --> channel epochs that passed the filter
+            passed = {}
+            for (net_code, sta_code, istn, station, ichn, channel) in matches:
+                logger.info("Sta:%s Cha:%s Loc:%s %s-%s passed filter" %
+                            (sta_code, channel.code, channel.location_code, channel.start_date, channel.end_date))
+                passed.setdefault(id(station), []).append(channel)
 
-                for sta_code, sta_epochs in net_dict['sta_codes'].items():
+            for net_code, net_dict in xml_dict['net_codes'].items():
+                for sta_code in list(net_dict['sta_codes'].keys()):
                     stn_epochs = []
-                    if not scnl_filter.STA or scnl_filter.STA == sta_code:
-                        for station in sta_epochs:
-                            channel_epochs = []
-                            for ichn, channel in enumerate(station.channels):
-                                #print("Here scnl_filter.LOC=[%s]" % scnl_filter.LOC)
-                                if (scnl_filter.LOC is None or scnl_filter.LOC == channel.location_code) and \
-                                   (scnl_filter.CHA is None or scnl_filter.CHA == channel.code):
-                                    logger.info("Sta:%s Cha:%s Loc:%s %s-%s passed filter" %
-                                                (sta_code, channel.code, channel.location_code, channel.start_date, channel.end_date))
-                                    channel_epochs.append(channel)
-
-                            if channel_epochs:
-                                station.channels = channel_epochs
-                                stn_epochs.append(station)
+                    for station in net_dict['sta_codes'][sta_code]:
+                        if id(station) in passed:
+                            if len(passed[id(station)]) != len(station.channels):
+                                mark_modified(station)
+                            station.channels = passed[id(station)]
+                            stn_epochs.append(station)
 
                     if stn_epochs:
-                        new_dict['sta_codes'][sta_code] = stn_epochs
+                        net_dict['sta_codes'][sta_code] = stn_epochs
+                    else:
+                        net_dict['sta_codes'].pop(sta_code)
+
+            index.rebuild()
 
-            xml_dict['net_codes'][net_code] = new_dict
+        if has_window(scnl_filter):
+            filter_window(xml_dict, scnl_filter)
+            index.rebuild()
 
 
     return
 
 
+def filter_window(xml_dict, scnl_filter):
+    """
+    Remove the station + channel epochs of xml_dict that are not active within
+        the --starttime/--endtime window of scnl_filter (as fdsnws-station does)
+
+    :param xml_dict: python dict holding the metadata read from one xml file
+    :type xml_dict: dict
+
+    :param scnl_filter: STARTTIME, ENDTIME in microseconds (None = open)
+    :type scnl_filter: python class used as container
+    """
+    stations = [(net_code, sta_code, station) for net_code, net_dict in xml_dict['net_codes'].items()
+                                              for sta_code, station_epochs in net_dict['sta_codes'].items()
+                                              for station in station_epochs]
+    in_window = window_filter([station for (net_code, sta_code, station) in stations], scnl_filter)
+
+    kept = {}
+    for (net_code, sta_code, station), keep in zip(stations, in_window):
+        epochs = kept.setdefault((net_code, sta_code), [])
+        if keep:
+            epochs.append(station)
+        else:
+            logger.info("Ignore net:%s stn:%s epoch %s-%s" % (net_code, sta_code, station.start_date, station.end_date))
+
+    for (net_code, sta_code), epochs in kept.items():
+        if epochs:
+            xml_dict['net_codes'][net_code]['sta_codes'][sta_code] = epochs
+        else:
+            xml_dict['net_codes'][net_code]['sta_codes'].pop(sta_code)
+
+    stations = [station for epochs in kept.values() for station in epochs]
+    channels = [channel for station in stations for channel in station.channels]
+    in_window = iter(window_filter(channels, scnl_filter))
+    for station in stations:
+        station_channels = [channel for channel in station.channels if next(in_window)]
+        if len(station_channels) != len(station.channels):
+            mark_modified(station)
+            station.channels = station_channels
+
+
 def update_root_field(xml_list, args):
     """
     Update a root field of FDSN StationXML within xml_list
@@ -432,46 +706,107 @@ def update_field(xml_list, scnl_filter, args):
 
     if level == 'network':
         for xml_dict in xml_list:
-            for net_code, net_dict in xml_dict['net_codes'].items():
-                if not scnl_filter.NET or scnl_filter.NET == net_code:
-                    network = net_dict['network']
-                    logger.info("Update: net:%s ==> field:%s" % (network.code, field))
-                    success = _set_field(network, field)
+            index = get_index(xml_dict)
+            for net_code in index.find_networks(scnl_filter.NET):
+                network = xml_dict['net_codes'][net_code]['network']
+                logger.info("Update: net:%s ==> field:%s" % (network.code, field))
+                success = _set_field(network, field)
+                mark_modified(network)
+
+                # Networks are keyed by their code
+                if field == 'code' and network.code != net_code:
+                    rekey_network(xml_dict, net_code)
 
     elif level == 'station':
         for xml_dict in xml_list:
-            for net_code, net_dict in xml_dict['net_codes'].items():
-                if not scnl_filter.NET or scnl_filter.NET == net_code:
-                    for sta_code in list(net_dict['sta_codes'].keys()):
-                        if not scnl_filter.STA or scnl_filter.STA == sta_code:
-                            for i, station in enumerate(net_dict['sta_codes'][sta_code]):
-                                if scnl_filter.STN_EPOCH is None or scnl_filter.STN_EPOCH == i:
-                                    logger.info("Update net:%s stn:%s [%d] field:%s" % \
-                                                (net_code, sta_code, i, field))
-                                    success = _set_field(station, field)
+            index = get_index(xml_dict)
+            for net_code, sta_code in index.find_stations(scnl_filter.NET, scnl_filter.STA):
+                station_epochs = xml_dict['net_codes'][net_code]['sta_codes'][sta_code]
+                in_window = window_filter(station_epochs, scnl_filter)
+                for i, station in enumerate(station_epochs):
+                    if (scnl_filter.STN_EPOCH is None or scnl_filter.STN_EPOCH == i) and in_window[i]:
+                        logger.info("Update net:%s stn:%s [%d] field:%s" % \
+                                    (net_code, sta_code, i, field))
+                        success = _set_field(station, field)
+                        mark_modified(station)
+
+                # Stations are keyed by their code
+                if field == 'code':
+                    rekey_stations(xml_dict, net_code, sta_code)
     else:
         for xml_dict in xml_list:
-            for net_code, net_dict in xml_dict['net_codes'].items():
-                if not scnl_filter.NET or scnl_filter.NET == net_code:
-                    for sta_code, station_epochs in net_dict['sta_codes'].items():
-                        if not scnl_filter.STA or scnl_filter.STA == sta_code:
-                            for istn, station in enumerate(station_epochs):
-                                for ichn, channel in enumerate(station.channels):
-                                    keycode = "%s.%s" % (channel.code, channel.location_code)
-                                    if not scnl_filter.LOC or scnl_filter.LOC == channel.location_code:
-                                      if not scnl_filter.CHA or scnl_filter.CHA == channel.code:
-
-                                        if (scnl_filter.STN_EPOCH is None or scnl_filter.STN_EPOCH == istn) and \
-                                           (scnl_filter.CHN_EPOCH is None or scnl_filter.CHN_EPOCH == ichn):
-                                            logger.info("Update net:%s stn:%s [%d] chn:%s [%d] field:%s" % \
-                                                        (net_code, sta_code, istn, keycode, ichn, field))
-                                            success = _set_field(channel, field)
+            index = get_index(xml_dict)
+            matches = index.find_channels(scnl_filter.NET, scnl_filter.STA,
+                                          scnl_filter.LOC, scnl_filter.CHA,
+                                          scnl_filter.STN_EPOCH, scnl_filter.CHN_EPOCH)
+            matches = window_matches(matches, scnl_filter)
+            for (net_code, sta_code, istn, station, ichn, channel) in matches:
+                keycode = "%s.%s" % (channel.code, channel.location_code)
+                logger.info("Update net:%s stn:%s [%d] chn:%s [%d] field:%s" % \
+                            (net_code, sta_code, istn, keycode, ichn, field))
+                success = _set_field(channel, field)
+                mark_modified(station)
+
+            # Channels are indexed by their codes
+            if field in {'code', 'location_code'}:
+                for net_code, sta_code in {(match[0], match[1]) for match in matches}:
+                    index.reindex_station(net_code, sta_code)
     if not success:
         logger.error("Update failed, either because no matching basenodes found or because of error setting attrib")
     return
 
 
 
+def rekey_network(xml_dict, net_code):
+    """
+    Move network net_code under its (updated) network.code in xml_dict['net_codes']
+        so that subsequent operations (e.g., in a --batch) can find it by its new code.
+
+    :param xml_dict: python dict containing metadata
+    :type xml_dict: python dict
+
+    :param net_code: network code the network is currently keyed under
+    :type net_code: str
+    """
+    new_code = xml_dict['net_codes'][net_code]['network'].code
+    if new_code in xml_dict['net_codes']:
+        logger.warning("Network code:%s already exists --> net:%s is still keyed as %s" % \
+                       (new_code, new_code, net_code))
+        return
+    xml_dict['net_codes'][new_code] = xml_dict['net_codes'].pop(net_code)
+    index = get_index(xml_dict)
+    index.remove_network(net_code)
+    index.add_network(new_code)
+    return
+
+
+def rekey_stations(xml_dict, net_code, sta_code):
+    """
+    Move any epochs of station net_code.sta_code whose station.code has been updated
+        under their new code in net_dict['sta_codes'] and reindex them.
+
+    :param xml_dict: python dict containing metadata
+    :type xml_dict: python dict
+
+    :param net_code: network code
+    :type net_code: str
+
+    :param sta_code: station code the epochs are currently keyed under
+    :type sta_code: str
+    """
+    sta_codes = xml_dict['net_codes'][net_code]['sta_codes']
+    epochs = sta_codes.pop(sta_code)
+    new_codes = {sta_code}
+    for station in epochs:
+        sta_codes.setdefault(station.code, []).append(station)
+        new_codes.add(station.code)
+
+    index = get_index(xml_dict)
+    for code in new_codes:
+        index.reindex_station(net_code, code)
+    return
+
+
 def add_base_node(xml_list, scnl_filter, level, obj):
     """
     Locate the appropriate position in xml_list and insert a new 
@@ -501,6 +836,7 @@ def add_base_node(xml_list, scnl_filter, level, obj):
                 xml_dict['net_codes'][obj.code] = {}
                 xml_dict['net_codes'][obj.code]['network'] = obj
                 xml_dict['net_codes'][obj.code]['sta_codes'] = {}
+                get_index(xml_dict).add_network(obj.code)
 
 # MTH: if obj = Station, then it can go in 1...N networks specified by filter
 # Right now the new Station is added to end of each network stations list
@@ -512,13 +848,15 @@ def add_base_node(xml_list, scnl_filter, level, obj):
             return None
         else:
             for xml_dict in xml_list:
-                for net_code, net_dict in xml_dict['net_codes'].items():
-                    if not scnl_filter.NET or scnl_filter.NET == net_code:
+                index = get_index(xml_dict)
+                for net_code in index.find_networks(scnl_filter.NET):
+                    net_dict = xml_dict['net_codes'][net_code]
                     # If this station code already present append a new epoch to its list of Station (epochs)
-                        if obj.code in net_dict['sta_codes']:
-                            net_dict['sta_codes'][obj.code].append(obj)
-                        else:
-                            net_dict['sta_codes'][obj.code] = [obj]
+                    if obj.code in net_dict['sta_codes']:
+                        net_dict['sta_codes'][obj.code].append(obj)
+                    else:
+                        net_dict['sta_codes'][obj.code] = [obj]
+                    index.reindex_station(net_code, obj.code)
 
 # MTH: To add a Channel we need to know which Station(s) will get it
     elif isinstance(obj, Channel):
@@ -527,15 +865,16 @@ def add_base_node(xml_list, scnl_filter, level, obj):
             return None
         else:
             for xml_dict in xml_list:
-                for net_code, net_dict in xml_dict['net_codes'].items():
-                    if not scnl_filter.NET or scnl_filter.NET == net_code:
-                        for sta_code, station_epochs in net_dict['sta_codes'].items():
-                            if not scnl_filter.STA or scnl_filter.STA == sta_code:
-                                #for station in station_epochs:
-                                    #for channel in station.channels:
+                index = get_index(xml_dict)
+                for net_code, sta_code in index.find_stations(scnl_filter.NET, scnl_filter.STA):
+                    station_epochs = xml_dict['net_codes'][net_code]['sta_codes'][sta_code]
+                    #for station in station_epochs:
+                        #for channel in station.channels:
 
-                                # Inside matching sta_code - which epoch gets it ?
-                                station_epochs[-1].channels.append(obj)
+                    # Inside matching sta_code - which epoch gets it ?
+                    station_epochs[-1].channels.append(obj)
+                    mark_modified(station_epochs[-1])
+                    index.reindex_station(net_code, sta_code)
 
     else:
         logger.error("ERROR: Unknown combination: obj type:%s + level" % (type(obj)))
@@ -556,62 +895,70 @@ def delete_base_node(xml_list, level, scnl_filter):
 
     if level == 'network':
         for xml_dict in xml_list:
-            if scnl_filter.NET in xml_dict['net_codes'].copy():
+            if not scnl_filter.NET:
+                continue
+            index = get_index(xml_dict)
+            for net_code in index.find_networks(scnl_filter.NET):
                 try:
-                    logger.info("Delete network=%s" % scnl_filter.NET)
-                    xml_dict['net_codes'].pop(scnl_filter.NET)
+                    logger.info("Delete network=%s" % net_code)
+                    xml_dict['net_codes'].pop(net_code)
+                    index.remove_network(net_code)
                 except KeyError:
-                    logger.error("Key not found:%s" % scnl_filter.NET)
+                    logger.error("Key not found:%s" % net_code)
 
     elif level == 'station':
         for xml_dict in xml_list:
-            for net_code, net_dict in xml_dict['net_codes'].items():
-                if not scnl_filter.NET or scnl_filter.NET == net_code:
-
-                    for sta_code in list(net_dict['sta_codes'].keys()):
-                        if not scnl_filter.STA or scnl_filter.STA == sta_code:
-
-                            if scnl_filter.STN_EPOCH is None: # Could have scnl_filter.STN_EPOCH = 0
-                                try:
-                                    logger.info("Delete net:%s stn:%s all epochs" % (net_code, sta_code))
-                                    net_dict['sta_codes'].pop(sta_code)
-                                except KeyError:
-                                    logger.error("Key not found:%s" % sta_code)
-                            else:
-                                epochs = net_dict['sta_codes'][sta_code]
-                                cleaned_epochs = []
-                                for i, epoch in enumerate(epochs):
-                                    if i == scnl_filter.STN_EPOCH:
-                                        logger.info("Delete net:%s stn:%s epoch:%d" % (net_code, sta_code, i))
-                                    else:
-                                        cleaned_epochs.append(epoch)
-
-                                net_dict['sta_codes'][sta_code] = cleaned_epochs
+            index = get_index(xml_dict)
+            for net_code, sta_code in index.find_stations(scnl_filter.NET, scnl_filter.STA):
+                net_dict = xml_dict['net_codes'][net_code]
+
+                if scnl_filter.STN_EPOCH is None and not has_window(scnl_filter): # Could have scnl_filter.STN_EPOCH = 0
+                    try:
+                        logger.info("Delete net:%s stn:%s all epochs" % (net_code, sta_code))
+                        net_dict['sta_codes'].pop(sta_code)
+                    except KeyError:
+                        logger.error("Key not found:%s" % sta_code)
+                else:
+                    epochs = net_dict['sta_codes'][sta_code]
+                    in_window = window_filter(epochs, scnl_filter)
+                    cleaned_epochs = []
+                    for i, epoch in enumerate(epochs):
+                        if (scnl_filter.STN_EPOCH is None or i == scnl_filter.STN_EPOCH) and in_window[i]:
+                            logger.info("Delete net:%s stn:%s epoch:%d" % (net_code, sta_code, i))
+                        else:
+                            cleaned_epochs.append(epoch)
+
+                    net_dict['sta_codes'][sta_code] = cleaned_epochs
+
+                index.reindex_station(net_code, sta_code)
 
     else:
         for xml_dict in xml_list:
-            for net_code, net_dict in xml_dict['net_codes'].items():
-                if not scnl_filter.NET or scnl_filter.NET == net_code:
-                    for sta_code, station_epochs in net_dict['sta_codes'].items():
-                        if not scnl_filter.STA or scnl_filter.STA == sta_code:
-                            for istn, station in enumerate(station_epochs):
-                                cleaned_channels = copy.deepcopy(station.channels)
-                                modified = False
-                                for ichn, channel in enumerate(station.channels):
-                                    if not scnl_filter.LOC or scnl_filter.LOC == channel.location_code:
-                                      if not scnl_filter.CHA or scnl_filter.CHA == channel.code:
-
-                                        if (scnl_filter.STN_EPOCH is None or scnl_filter.STN_EPOCH == istn) and \
-                                           (scnl_filter.CHN_EPOCH is None or scnl_filter.CHN_EPOCH == ichn):
+            index = get_index(xml_dict)
+            matches = index.find_channels(scnl_filter.NET, scnl_filter.STA,
+                                          scnl_filter.LOC, scnl_filter.CHA,
+                                          scnl_filter.STN_EPOCH, scnl_filter.CHN_EPOCH)
+            matches = window_matches(matches, scnl_filter)
+
+            # Group the matching channel epochs (by identity) under the station epoch that holds them
+            station_matches = {}
+            for (net_code, sta_code, istn, station, ichn, channel) in matches:
+                keycode = "%s.%s" % (channel.code, channel.location_code)
+                logger.info("Remove net:%s stn:%s [%d] chn:%s [%d] epoch" % \
+                           (net_code, sta_code, istn, keycode, ichn))
+                if id(station) not in station_matches:
+                    station_matches[id(station)] = (station, set())
+                station_matches[id(station)][1].add(id(channel))
 
-                                            keycode = "%s.%s" % (channel.code, channel.location_code)
-                                            logger.info("Remove net:%s stn:%s [%d] chn:%s [%d] epoch" % \
-                                                       (net_code, sta_code, istn, keycode, ichn))
-                                            cleaned_channels.remove(channel)
-                                            modified = True
+            # Single pass over each station's channels: keep references to the
+            #   survivors, nothing (esp. responses) gets copied or compared
+            for station, channel_ids in station_matches.values():
+                station.channels = [channel for channel in station.channels
+                                    if id(channel) not in channel_ids]
+                mark_modified(station)
 
-                                if modified:
-                                    station.channels = cleaned_channels
+            for net_code, sta_code in {(match[0], match[1]) for match in matches}:
+                index.reindex_station(net_code, sta_code)
 
 
     return
@@ -619,17 +966,32 @@ def delete_base_node(xml_list, level, scnl_filter):
 
 
 
-def pack_xml_list_to_inv(xml_list):
+def pack_xml_list_to_inv(xml_list, merge='first-wins'):
     """
     Convert xml_list of dictionaries containing network(s) metadata to obspy inventory object
 
+        Networks are merged across all xml_dicts by (code, start_date) and station epochs
+        by (code, start_date, end_date), so that e.g., 2 input files both containing
+        network IU give one <Network code="IU"> holding the station epochs of both.
+        Station epochs (or network attributes) with the same key but different contents
+        are resolved by merge (the input xml kept by --passthrough is not compared):
+            first-wins: keep the one from the first file in xml_list
+            last-wins:  keep the one from the last file in xml_list
+            error:      log an error and exit
+
     :param xml_list: List of python dicts containing metadata
     :type xml_list: list
 
+    :param merge: Conflict resolution, one of MERGE_POLICIES
+    :type merge: str
+
     :returns: Inventory object created from xml_list
     :rtype: obspy.core.inventory.inventory
     """
 
+    if merge not in MERGE_POLICIES:
+        raise ValueError("merge=%s must be one of %s" % (merge, MERGE_POLICIES))
+
     source = xml_list[0]['source']
     sender = xml_list[0]['sender']
     module = xml_list[0]['module']
@@ -637,73 +999,240 @@ def pack_xml_list_to_inv(xml_list):
 
     inv = Inventory(source=source, sender=sender, module=module, module_uri=module_uri)
 
-    networks = []
+    # (code, start_date) --> [network, {(code, start_date, end_date) --> station}]
+    networks = {}
     for xml_dict in xml_list:
         for net_code in xml_dict['net_codes']:
             network = xml_dict['net_codes'][net_code]['network']
-            stations = []
+            net_key = (network.code, _ns(network.start_date))
+            if net_key not in networks:
+                networks[net_key] = [network, {}]
+            elif networks[net_key][0] is not network and _network_attrs(networks[net_key][0]) != _network_attrs(network):
+                _merge_conflict(merge, "Net:%s start_date:%s" % (network.code, network.start_date), xml_dict['xmlfile'])
+                if merge == 'last-wins':
+                    networks[net_key][0] = network
+
+            stations = networks[net_key][1]
             for sta_code in xml_dict['net_codes'][net_code]['sta_codes']:
-                stations.extend(xml_dict['net_codes'][net_code]['sta_codes'][sta_code])
-            network.stations = stations
-            networks.append(network)
-
-    inv.networks = networks
+                for station in xml_dict['net_codes'][net_code]['sta_codes'][sta_code]:
+                    sta_key = (station.code, _ns(station.start_date), _ns(station.end_date))
+                    if sta_key in stations and stations[sta_key] is not station:
+                        if _station_attrs(stations[sta_key]) == _station_attrs(station):
+                            continue
+                        _merge_conflict(merge, "Net:%s Stn:%s epoch:%s - %s" % (network.code, station.code,
+                                        station.start_date, station.end_date), xml_dict['xmlfile'])
+                        if merge == 'first-wins':
+                            continue
+                    stations[sta_key] = station
+
+    for network, stations in networks.values():
+        network.stations = list(stations.values())
+
+    inv.networks = [network for network, stations in networks.values()]
 
     return inv
 
-def load_xmlfiles(xmlfiles):
+def _ns(date):
+    # UTCDateTime isn't hashable: key dates by their (int) nanoseconds
+    return date.ns if date is not None else None
+
+def _network_attrs(network):
+    # Everything but the stations, their counts (+ the input xml kept by --passthrough)
+    return {key: value for key, value in network.__dict__.items()
+            if key not in ('_stations', '_total_number_of_stations', '_selected_number_of_stations', '_raw_xml')}
+
+def _station_attrs(station):
+    # Everything but the input xml kept by --passthrough
+    return {key: value for key, value in station.__dict__.items() if key != '_raw_xml'}
+
+def _merge_conflict(merge, what, xmlfile):
+    if merge == 'error':
+        logger.error("Merge conflict: %s in xmlfile:%s differs from an earlier input --> "
+                     "Use --merge=first-wins or --merge=last-wins" % (what, xmlfile))
+        exit(2)
+    logger.warning("Merge conflict: %s in xmlfile:%s differs from an earlier input --> keep %s" %
+                   (what, xmlfile, 'first' if merge == 'first-wins' else 'last'))
+
+def load_xmlfiles(xmlfiles, jobs=1, lazy_responses=False, passthrough=False):
     """
     Read list of xmlfile(s) into a list of python dicts, one for each xml file,
           where the python dict holds the obspy inventory network objects
           read from the file
 
     :param xmlfiles: List of xmlfiles with common FDSN schema version
+                     Each item is either a path or an already ingested
+                     xml_doc (see libs_xml.read_xmlfile) whose tree is reused
     :type xmlfiles: list
 
-    :returns: list of python dicts
+    :param jobs: Number of worker processes to load files with
+                 [default=1 = serial, 0 or None = one per cpu]
+    :type jobs: int
+
+    :param lazy_responses: Keep channel responses as raw XML, only parsed when used
+    :type lazy_responses: bool
+
+    :param passthrough: Keep the input xml of networks/stations to copy untouched ones to output
+    :type passthrough: bool
+
+    :returns: list of python dicts (in same order as xmlfiles)
     :rtype: list
     """
 
+    if not jobs:
+        jobs = os.cpu_count()
+
+    if jobs > 1 and len(xmlfiles) > 1:
+        # Ingested trees can't be pickled --> each worker re-reads its file from path
+        paths = [x['xmlfile'] if isinstance(x, dict) else x for x in xmlfiles]
+        logger.info("load_xmlfiles: load %d files with %d worker processes" %
+                    (len(paths), min(jobs, len(paths))))
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+            # executor.map returns results in input order
+            results = list(executor.map(_load_xmlfile, paths, [lazy_responses] * len(paths),
+                                        [passthrough] * len(paths)))
+    else:
+        results = (_load_xmlfile(xml_doc, lazy_responses, passthrough) for xml_doc in xmlfiles)
+
     xml_list = []
+    for xml_dict in results:
+        if xml_dict is None:
+            return None
+        xml_list.append(xml_dict)
 
-    for xmlfile in xmlfiles:
+    return xml_list
 
-        #logger.info("Read_inventory from file:[%s] thread:[%s]" % (xmlfile, threading.get_ident()))
 
-        try:
-            inv = read_inventory(xmlfile)
-        except ValueError as e:
-            logger.error("Problem reading xml file:%s" % repr(e))
+def load_validate_xmlfiles(xmlfiles, schema_version, jobs=1, lazy_responses=False, passthrough=False):
+    """
+    Validate + load list of xmlfile(s) (paths) like validate_xmlfiles + load_xmlfiles would,
+        but with each file parsed only once: with jobs > 1, each worker process
+        validates the tree it parsed before loading it
+
+    :param xmlfiles: List of paths of xmlfiles with common FDSN schema version
+    :type xmlfiles: list
+
+    :param schema_version: StationXML schema version to validate against
+    :type schema_version: str
+
+    :param jobs: Number of worker processes [default=1 = serial, 0 or None = one per cpu]
+    :type jobs: int
+
+    :param lazy_responses: Keep channel responses as raw XML, only parsed when used
+    :type lazy_responses: bool
+
+    :param passthrough: Keep the input xml of networks/stations to copy untouched ones to output
+    :type passthrough: bool
+
+    :returns: list of python dicts (in same order as xmlfiles) -or- None if any
+              file can't be read or is not valid
+    :rtype: list
+
+    :returns: validation report (see validate_xmlfiles), one result per file
+    :rtype: list
+    """
+
+    if not jobs:
+        jobs = os.cpu_count()
+
+    args = (xmlfiles, [schema_version] * len(xmlfiles), [lazy_responses] * len(xmlfiles),
+            [passthrough] * len(xmlfiles))
+    if jobs > 1 and len(xmlfiles) > 1:
+        logger.info("load_validate_xmlfiles: load %d files with %d worker processes" %
+                    (len(xmlfiles), min(jobs, len(xmlfiles))))
+        with ProcessPoolExecutor(max_workers=min(jobs, len(xmlfiles))) as executor:
+            results = list(executor.map(_load_validate_xmlfile, *args))
+    else:
+        results = list(map(_load_validate_xmlfile, *args))
+
+    xml_list = [xml_dict for (xml_dict, result) in results]
+    report = [result for (xml_dict, result) in results]
+    if any(xml_dict is None for xml_dict in xml_list):
+        xml_list = None
+
+    return xml_list, report
+
+
+def _load_validate_xmlfile(xmlfile, schema_version, lazy_responses=False, passthrough=False):
+    """
+    Parse xmlfile once, validate the tree against schema_version and (if valid) load it
+        Runs in a worker process when load_validate_xmlfiles is called with jobs > 1
+
+    :returns: python dict (None if xmlfile can't be read or is not valid)
+              + its validation result (see validate_xmlfiles)
+    :rtype: tuple
+    """
+    xml_doc = read_xmlfile(xmlfile, schema_version=schema_version)
+    if xml_doc is None:
+        return None, {'xmlfile': xmlfile, 'schema_version': schema_version, 'valid': False,
+                      'errors': ["file=[%s] is NOT a XML file!" % xmlfile]}
+
+    result = validate_xmlfiles([xml_doc], schema_version)[0]
+    if not result['valid']:
+        return None, result
+
+    return _load_xmlfile(xml_doc, lazy_responses, passthrough), result
+
+
+def _load_xmlfile(xml_doc, lazy_responses=False, passthrough=False):
+    """
+    Read a single xmlfile into a python dict holding the obspy inventory
+        network objects read from the file.
+        Runs in a worker process when load_xmlfiles is called with jobs > 1
+
+    :param xml_doc: Path of xmlfile -or- already ingested xml_doc
+    :type xml_doc: str or dict
+
+    :param lazy_responses: Keep channel responses as raw XML, only parsed when used
+    :type lazy_responses: bool
+
+    :param passthrough: Keep the input xml of networks/stations to copy untouched ones to output
+    :type passthrough: bool
+
+    :returns: python dict -or- None if file can't be read
+    :rtype: dict
+    """
+
+    #logger.info("Read_inventory from file:[%s] thread:[%s]" % (xmlfile, threading.get_ident()))
+
+    if not isinstance(xml_doc, dict):
+        xml_doc = read_xmlfile(xml_doc)
+        if xml_doc is None:
             return None
+    xmlfile = xml_doc['xmlfile']
 
-        xml_dict = {}
-        xml_list.append(xml_dict)
+    try:
+        inv = _read_stationxml(xml_doc['tree'], lazy_responses=lazy_responses, passthrough=passthrough)
+    except (ValueError, AttributeError) as e:
+        logger.error("Problem reading xml file:%s" % repr(e))
+        return None
 
-        xml_dict['xmlfile'] = xmlfile
-        xml_dict['source']  = inv.source
-        xml_dict['sender']  = inv.sender
-        xml_dict['module']  = inv.module
-        xml_dict['module_uri'] = inv.module_uri
-        xml_dict['net_codes'] = {}
+    xml_dict = {}
 
-        for network in inv.networks:
-            net_dict = network_to_dict(network)
-            xml_dict['net_codes'][network.code] = net_dict
-            xml_dict['net_codes'][network.code]['network'] = network
+    xml_dict['xmlfile'] = xmlfile
+    xml_dict['source']  = inv.source
+    xml_dict['sender']  = inv.sender
+    xml_dict['module']  = inv.module
+    xml_dict['module_uri'] = inv.module_uri
+    xml_dict['net_codes'] = {}
 
-    return xml_list
+    for network in inv.networks:
+        net_dict = network_to_dict(network)
+        xml_dict['net_codes'][network.code] = net_dict
+        xml_dict['net_codes'][network.code]['network'] = network
+
+    return xml_dict
 
 
-def print_all(xml_list, args):
+def print_all(xml_list, args, scnl_filter=None):
 
     for xml_dict in xml_list:
         print("[File:%s]" % xml_dict['xmlfile'])
         for net_code, net_dict in xml_dict['net_codes'].items():
             print("  [Net:%s]" % net_code)
-            print_net(net_dict, args)
+            print_net(net_dict, args, scnl_filter)
 
 
-def print_net(net_dict, args):
+def print_net(net_dict, args, scnl_filter=None):
     """
     Checks a list of epochs for overlap
         If overlap found, returns 1 + list of overlap messages
@@ -720,9 +1249,13 @@ def print_net(net_dict, args):
     :rtype: list
     """
 
+    # Only the epochs within the --starttime/--endtime window (if any) are printed,
+    #   with their epoch[i] ordinals in the full (sorted) list of epochs
     for stn_code, stn_epochs in net_dict['sta_codes'].items():
 
-        for istn, station in enumerate(stn_epochs):
+        for istn, (station, in_window) in enumerate(zip(stn_epochs, window_filter(stn_epochs, scnl_filter))):
+            if not in_window:
+                continue
             #print("stn:%s epoch:%s - %s [nchan=%d]" % \
                   #(station.code, station.start_date, station.end_date, len(station.channels)))
             print("    [Stn:%4s] epoch[%d]:%s - %s" % \
@@ -743,7 +1276,10 @@ def print_net(net_dict, args):
 
                     print("      [ Op: %d] names:%s agencies:%s" % (io, names, agencies))
 
-            for ichan, channel in enumerate(station.channels):
+            for ichan, (channel, in_window) in enumerate(zip(station.channels,
+                                                             window_filter(station.channels, scnl_filter))):
+                if not in_window:
+                    continue
                 loc_code = channel.location_code if channel.location_code else '--'
                 key_code = "%s.%s" % (channel.code, loc_code)
                 #print(key_code)
@@ -754,79 +1290,120 @@ def print_net(net_dict, args):
                         print("          [Cmt: %d] %s" % (ic, comment))
 
 
-def network_to_dict(network):
+def network_to_dict(network, sort=False):
     """
-    Convert obspy Network object to compound dict of sorted Station/Channel
-        objects (epochs).
-        Check for overlapping epochs at both Station + Channel level
+    Convert obspy Network object to compound dict of Station objects (epochs)
+        grouped by station code.
+        The epochs are kept in input order (a straight parse) unless sort
+        (see sort_net_dict, only needed for epoch ordinals/printing)
 
     :param network: Network
     :type network: obspy.core.inventory.network.Network
 
-    :returns: Nested dict of sorted epochs
+    :param sort: Sort epochs + check them for overlap
+    :type sort: bool
+
+    :returns: Nested dict of epochs
     :rtype: dict
     """
 
     net_dict = {}
     net_dict['sta_codes'] = {}
 
-    # Sort all station epochs by code + start_date
-    sorted_stations = []
-
-    for station in network.stations:
-        sorted_stations.append(station)
-    sorted_stations.sort(key=lambda x: (x.code, x.start_date), reverse=False)
-
     # Load up dict by station code
-    stn_dict = {}
-    for station in sorted_stations:
-        if station.code in stn_dict:
-            l = stn_dict[station.code]
+    for station in network.stations:
+        if station.code in net_dict['sta_codes']:
+            l = net_dict['sta_codes'][station.code]
         else:
             l = []
-            stn_dict[station.code] = l
+            net_dict['sta_codes'][station.code] = l
         l.append(station)
 
-    # Store list of station_epochs in net_dict under stn_code
-    for stn_code, station_epochs in stn_dict.items():
-        net_dict['sta_codes'][stn_code] = station_epochs
+    if sort:
+        sort_net_dict(net_dict)
+
+    return net_dict
 
-        # Check for overlapping station epochs:
-        (overlap, msgs) = overlapping_epochs(station_epochs)
-        if overlap:
-            logger.warning("Stn:%s has overlapping station epochs!" % (station.code))
-            for msg in msgs:
-                logger.warning(msg)
 
-        # For each station_epoch, sort its channel epochs by keycode + start_date:
-        for station in station_epochs:
-            sorted_channels = []
-            for channel in station.channels:
-                sorted_channels.append(channel)
-            sorted_channels.sort(key=lambda x: (x.location_code, x.code, x.start_date), reverse=False)
+def sort_net_dict(net_dict):
+    """
+    Sort the Station epochs of net_dict by code + start_date and the channels of
+        each station epoch by location + channel code + start_date, as the epoch
+        ordinals (--epoch_station, --epoch_channel, --print-epochs) expect them.
+        Check for overlapping epochs at both Station + Channel level
 
-            station.channels = sorted_channels
+        All the station (channel) epochs of the network are sorted + checked
+        at once in an EpochTable
 
-        # Check for overlapping channel epochs:
-            chn_dict = {}
-            for channel in sorted_channels:
-                keycode = "%s.%s" % (channel.code, channel.location_code)
-                if keycode in chn_dict:
-                    l = chn_dict[keycode]
-                else:
-                    l = []
-                    chn_dict[keycode] = l
-                l.append(channel)
+    :param net_dict: Nested dict of epochs (see network_to_dict)
+    :type net_dict: dict
+    """
 
-            for keycode, channel_epochs in chn_dict.items():
-                (overlap, msgs) = overlapping_epochs(channel_epochs)
-                if overlap:
-                    logger.error("Stn:%s Chn:%s has overlapping channel epochs!" % (station.code, keycode))
-                    for msg in msgs:
-                        logger.warning(msg)
+    stations = EpochTable.from_epochs((stn_code, station.start_date, station.end_date, station)
+                                      for stn_code, station_epochs in net_dict['sta_codes'].items()
+                                      for station in station_epochs).sort()
 
+    stn_dict = {}
+    for stn_code, station in zip((stations.id_names[i] for i in stations.ids.tolist()), stations.refs):
+        stn_dict.setdefault(stn_code, []).append(station)
+    net_dict['sta_codes'] = stn_dict
+
+    # Check for overlapping station epochs:
+    for stn_code, msgs in overlap_msgs(stations).items():
+        logger.warning("Stn:%s has overlapping station epochs!" % (stn_code))
+        for msg in msgs:
+            logger.warning(msg)
+
+    # Sort the channel epochs of each station epoch by keycode + start_date:
+    station_list = stations.refs
+    channels = EpochTable.from_epochs(((istn, channel.location_code, channel.code),
+                                       channel.start_date, channel.end_date, channel)
+                                      for istn, station in enumerate(station_list)
+                                      for channel in station.channels).sort()
+
+    sorted_channels = [[] for station in station_list]
+    for (istn, loc_code, cha_code), channel in zip((channels.id_names[i] for i in channels.ids.tolist()),
+                                                   channels.refs):
+        sorted_channels[istn].append(channel)
+    for station, station_channels in zip(station_list, sorted_channels):
+        station.channels = station_channels
+
+    # Check for overlapping channel epochs:
+    for (istn, loc_code, cha_code), msgs in overlap_msgs(channels).items():
+        keycode = "%s.%s" % (cha_code, loc_code)
+        logger.error("Stn:%s Chn:%s has overlapping channel epochs!" % (station_list[istn].code, keycode))
+        for msg in msgs:
+            logger.warning(msg)
 
-    return net_dict
+    return
+
+
+def sort_epochs(xml_list):
+    """
+    Sort (+ check for overlap) the epochs of every network in xml_list (see sort_net_dict)
+
+    :param xml_list: List of python dicts containing metadata
+    :type xml_list: list
+    """
+    for xml_dict in xml_list:
+        for net_code in xml_dict['net_codes']:
+            sort_net_dict(xml_dict['net_codes'][net_code])
+        # The epoch ordinals changed: the index is rebuilt on its next use
+        xml_dict.pop('index', None)
+
+
+def needs_epoch_order(args):
+    """
+    True if the operation(s) in args use epoch ordinals or print epochs:
+        only then are the epochs sorted + checked for overlap (see sort_epochs)
+
+    :param args: cmd line options
+    :type args: class argparse.Namespace
+    """
+    if args.print_epochs or args.print_all:
+        return True
+    ops = [op_args for (op_args, op_filter) in args.batch_ops] if args.action == 'batch' else [args]
+    return any(op.epoch_station is not None or op.epoch_channel is not None for op in ops)
 
 
 def overlapping_epochs(epoch_list):
@@ -847,41 +1424,77 @@ def overlapping_epochs(epoch_list):
     :rtype: list
     """
 
-    overlap = False
-
-    msgs = []
-    #print("overlapping_epochs: list_len=%d" % len(epoch_list))
-    for i in range(len(epoch_list)-1):
-
-        epoch1 = epoch_list[i]
-        epoch2 = epoch_list[i+1]
-        #print("Compare: i=%d" % i)
-        #print("  epoch1: %s - %s" % (epoch1.start_date, epoch1.end_date))
-        #print("  epoch2: %s - %s" % (epoch2.start_date, epoch2.end_date))
-
-        if epoch1.start_date == epoch2.start_date:
-            msgs.append("Epochs have same start_date")
-            overlap = True
-        # epoch1 better be closed
-        elif epoch1.end_date is None:
-            msgs.append("Earlier epoch not closed!")
-            overlap = True
-        # epoch1 close must precede epoch2 start
-        elif epoch1.end_date > epoch2.start_date:
-            msgs.append("epoch1 end > epoch2 start")
-            overlap = True
-
-        if overlap:
-            #print("Epoch:%s overlaps with epoch:%s" % (epoch1, epoch2))
-            #print("Epoch:%s overlaps with epoch:%s" % (epoch1.start, epoch2))
-            msgs.append("These epochs overlap:")
-            msgs.append("  epoch1: %s - %s" % (epoch1.start_date, epoch1.end_date))
-            msgs.append("  epoch2: %s - %s" % (epoch2.start_date, epoch2.end_date))
-            return 1, msgs
+    msgs = overlap_msgs(EpochTable.from_epochs((0, epoch.start_date, epoch.end_date, epoch)
+                                               for epoch in epoch_list))
+    if msgs:
+        return 1, msgs[0]
 
     return 0, []
 
 
+OVERLAP_REASONS = {'same_start': "Epochs have same start_date",
+                   'unclosed': "Earlier epoch not closed!",     # epoch1 better be closed
+                   'overlap': "epoch1 end > epoch2 start",      # epoch1 close must precede epoch2 start
+                  }
+
+def overlap_msgs(table):
+    """
+    Check the (sorted) epochs of an EpochTable for overlap with their next epoch
+
+    :param table: epochs, refs = objects with start_date + end_date
+    :type table: libs_epoch.EpochTable
+
+    :returns: {id: overlap messages} for each id with overlapping epochs
+              (the first overlapping pair of each id is described)
+    :rtype: dict
+    """
+    reasons = table.neighbour_overlaps()
+    msgs = {}
+    for i in np.nonzero(reasons)[0].tolist():
+        epoch_id = table.epoch_id(i)
+        if epoch_id in msgs:
+            continue
+        epoch1 = table.refs[i]
+        epoch2 = table.refs[i + 1]
+        msgs[epoch_id] = [OVERLAP_REASONS[reasons[i]],
+                          "These epochs overlap:",
+                          "  epoch1: %s - %s" % (epoch1.start_date, epoch1.end_date),
+                          "  epoch2: %s - %s" % (epoch2.start_date, epoch2.end_date)]
+    return msgs
+
+
+def window_filter(epochs, scnl_filter):
+    """
+    Check epochs against the --starttime/--endtime window of scnl_filter
+
+    :param epochs: Station or Channel objects
+    :type epochs: list
+
+    :param scnl_filter: STARTTIME, ENDTIME in microseconds (None = open)
+    :type scnl_filter: python class used as container
+
+    :returns: True for each epoch active within the window (all True if no window)
+    :rtype: list
+    """
+    if not has_window(scnl_filter):
+        return [True] * len(epochs)
+    table = EpochTable.from_epochs((0, epoch.start_date, epoch.end_date, None) for epoch in epochs)
+    return table.window(scnl_filter.STARTTIME, scnl_filter.ENDTIME).tolist()
+
+
+def window_matches(matches, scnl_filter):
+    """
+    Keep the SnclIndex.find_channels matches whose channel epoch is active
+        within the --starttime/--endtime window of scnl_filter
+    """
+    return [match for match, keep in zip(matches, window_filter([match[5] for match in matches], scnl_filter))
+            if keep]
+
+
+def has_window(scnl_filter):
+    return getattr(scnl_filter, 'STARTTIME', None) is not None or \
+           getattr(scnl_filter, 'ENDTIME', None) is not None
+
 
 if __name__ == "__main__":
     main()
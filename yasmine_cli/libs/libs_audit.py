@@ -0,0 +1,146 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import csv
+import json
+import sys
+
+from .libs_epoch import EpochTable, NS_PER_TICK
+
+import logging
+logger = logging.getLogger()
+
+AUDIT_FIELDS = ['level', 'type', 'id', 'epoch1_start', 'epoch1_end', 'epoch2_start', 'epoch2_end', 'seconds']
+
+
+def sweep_epochs(epochs, level):
+    """
+    Find every overlap, gap and unclosed epoch in one sorted pass over epochs:
+        Sort by (id, start) and sweep each id's epochs in order, keeping the latest end
+        seen so far, so that an epoch is checked against *all* the epochs before it,
+        not just its neighbour (see EpochTable.sweep).
+
+            overlap:  epoch2 starts before an earlier epoch1 ends
+            unclosed: epoch1 is open (no end_date) but a later epoch2 exists
+            gap:      epoch2 starts after every earlier epoch has ended
+
+    :param epochs: list of (id, start_ns, end_ns, ref), end_ns=None if open, where
+                   id is a str (e.g., 'IU.ANMO.00.BHZ') and ref is whatever should be reported
+                   for the epoch, e.g., (start_date, end_date). Sorted in place.
+    :type epochs: list
+
+    :param level: 'station' or 'channel', copied into each finding
+    :type level: str
+
+    :returns: findings: list of (level, type, id, ref1, ref2, seconds)
+              where seconds = length of the overlap/gap (None for unclosed)
+    :rtype: list
+    """
+    table = EpochTable([epoch[0] for epoch in epochs],
+                       [None if epoch[1] is None else epoch[1] // NS_PER_TICK for epoch in epochs],
+                       [None if epoch[2] is None else epoch[2] // NS_PER_TICK for epoch in epochs],
+                       epochs).sort()
+    epochs[:] = table.refs
+
+    return [(level, finding, epochs[row2][0], epochs[row1][3], epochs[row2][3], seconds)
+            for finding, row1, row2, seconds in table.sweep()]
+
+
+def _ns(date):
+    return date.ns if date is not None else None
+
+
+def audit_epochs(inventory):
+    """
+    Audit all station epochs (grouped by NET.STA) and channel epochs (grouped by NET.STA.LOC.CHA,
+        across all station epochs) of inventory for overlaps, gaps and unclosed epochs
+
+    :param inventory: Inventory to audit
+    :type inventory: obspy.core.inventory.inventory
+
+    :returns: report dict: {'summary': {counts}, 'findings': [row dicts with AUDIT_FIELDS]}
+    :rtype: dict
+    """
+    station_epochs = []
+    channel_epochs = []
+    for network in inventory.networks:
+        for station in network.stations:
+            sta_id = "%s.%s" % (network.code, station.code)
+            station_epochs.append((sta_id, _ns(station.start_date), _ns(station.end_date),
+                                   (station.start_date, station.end_date)))
+            for channel in station.channels:
+                channel_epochs.append(("%s.%s.%s" % (sta_id, channel.location_code, channel.code),
+                                       _ns(channel.start_date), _ns(channel.end_date),
+                                       (channel.start_date, channel.end_date)))
+
+    summary = {'station_epochs': len(station_epochs), 'channel_epochs': len(channel_epochs)}
+    summary['stations'] = len(set(epoch[0] for epoch in station_epochs))
+    summary['channels'] = len(set(epoch[0] for epoch in channel_epochs))
+
+    findings = sweep_epochs(station_epochs, 'station') + sweep_epochs(channel_epochs, 'channel')
+
+    rows = []
+    for level, finding, epoch_id, (start1, end1), (start2, end2), seconds in findings:
+        rows.append({'level': level, 'type': finding, 'id': epoch_id,
+                     'epoch1_start': str(start1) if start1 else None, 'epoch1_end': str(end1) if end1 else None,
+                     'epoch2_start': str(start2) if start2 else None, 'epoch2_end': str(end2) if end2 else None,
+                     'seconds': seconds})
+    for finding, count in (('overlap', 'overlaps'), ('gap', 'gaps'), ('unclosed', 'unclosed')):
+        summary[count] = sum(1 for row in rows if row['type'] == finding)
+
+    logger.info("audit_epochs: %d station epochs (%d stations) %d channel epochs (%d channels): "
+                "%d overlaps %d gaps %d unclosed" %
+                (summary['station_epochs'], summary['stations'], summary['channel_epochs'], summary['channels'],
+                 summary['overlaps'], summary['gaps'], summary['unclosed']))
+
+    return {'summary': summary, 'findings': rows}
+
+
+def write_audit(report, outfile=None):
+    """
+    Write the audit_epochs report as json (outfile ends in .json) -or- csv (one row per finding)
+
+    :param outfile: Path to report [default=stdout, csv]
+    :type outfile: str
+    """
+    fh = open(outfile, 'w', newline='') if outfile else sys.stdout
+    try:
+        if outfile and outfile.endswith('.json'):
+            json.dump(report, fh, indent=1)
+            fh.write('\n')
+        else:
+            writer = csv.DictWriter(fh, fieldnames=AUDIT_FIELDS)
+            writer.writeheader()
+            writer.writerows(report['findings'])
+    finally:
+        if outfile:
+            fh.close()
@@ -0,0 +1,211 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from .. import __version__
+
+import logging
+logger = logging.getLogger()
+
+# Bump when the layout of the cached xml_dict changes
+CACHE_FORMAT = 2
+# Default max size of the cache (MB)
+CACHE_SIZE = 1024
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir():
+    '''
+    $XDG_CACHE_HOME/yasmine [default=~/.cache/yasmine]
+    '''
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'yasmine')
+
+
+def file_hash(xmlfile):
+    '''
+    sha256 (hex) of the contents of xmlfile
+    '''
+    sha = hashlib.sha256()
+    with open(xmlfile, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class InventoryCache(object):
+    """
+    On-disk cache of load_xmlfiles results (one pickled xml_dict per input file)
+
+        Entries are keyed by the sha256 of the file contents + its schema version
+        + the yasmine version + the options it was loaded with, so a changed
+        file (or tool) never hits a stale entry. Reading an entry refreshes its
+        mtime and the least recently used entries are evicted once the cache
+        grows beyond max_size.
+    """
+
+    def __init__(self, cache_dir=None, max_size=CACHE_SIZE):
+        '''
+        :param cache_dir: Directory holding the cache [default=default_cache_dir()]
+        :type cache_dir: str
+
+        :param max_size: Max total size of the cache (MB)
+        :type max_size: int
+        '''
+        self.cache_dir = cache_dir if cache_dir else default_cache_dir()
+        self.max_size = max_size * 1024 * 1024
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, xmlfile, schema_version, **options):
+        '''
+        :param xmlfile: path of input file
+        :type xmlfile: str
+
+        :param schema_version: StationXML schema version of xmlfile
+        :type schema_version: str
+
+        :param options: load_xmlfiles options that change the loaded result (e.g., lazy_responses)
+        :type options: dict
+
+        :returns: cache key
+        :rtype: str
+        '''
+        sha = hashlib.sha256(file_hash(xmlfile).encode())
+        sha.update(("|%s|%s|%s" % (schema_version, __version__, CACHE_FORMAT)).encode())
+        for option in sorted(options):
+            sha.update(("|%s=%s" % (option, options[option])).encode())
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "%s.pkl" % key)
+
+    def get(self, key, validated=None):
+        '''
+        :param key: cache key (see key())
+        :type key: str
+
+        :param validated: If set, only return an entry whose file was validated
+                          against this schema version when it was cached
+        :type validated: str
+
+        :returns: cached xml_dict -or- None on a miss
+        :rtype: dict
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Cache: drop unreadable entry:%s Caught:%s" % (path, repr(e)))
+            self._remove(path)
+            return None
+
+        if validated and entry['validated'] != validated:
+            return None
+
+        os.utime(path)  # Most recently used
+        return entry['xml_dict']
+
+    def put(self, key, xml_dict, validated=None):
+        '''
+        :param key: cache key (see key())
+        :type key: str
+
+        :param xml_dict: loaded xml_dict to cache
+        :type xml_dict: dict
+
+        :param validated: schema version xmlfile was validated against (None = not validated)
+        :type validated: str
+        '''
+        # The SNCL index is rebuilt on demand
+        entry = {'validated': validated,
+                 'xml_dict': {k: v for k, v in xml_dict.items() if k != 'index'}}
+
+        # Write to a temp file + rename so readers never see a partial entry
+        fd, tmpfile = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfile, self._path(key))
+        except Exception as e:
+            logger.warning("Cache: unable to store entry for:%s Caught:%s" % (xml_dict['xmlfile'], repr(e)))
+            self._remove(tmpfile)
+            return
+
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for fname in os.listdir(self.cache_dir):
+            if fname.endswith('.pkl'):
+                path = os.path.join(self.cache_dir, fname)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        '''
+        Remove least recently used entries until the cache fits in max_size
+        '''
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            logger.info("Cache: evict %s" % path)
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        '''
+        Remove all entries
+        '''
+        entries = self._entries()
+        for mtime, size, path in entries:
+            self._remove(path)
+        logger.info("Cache: removed %d entries from %s" % (len(entries), self.cache_dir))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
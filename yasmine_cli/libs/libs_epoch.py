@@ -0,0 +1,240 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import numpy as np
+
+import logging
+logger = logging.getLogger()
+
+# Epoch times are int64 microseconds: int64 nanoseconds only reach the year 2262
+#   and end dates like 2599-12-31T23:59:59 are common in StationXML
+TICKS_PER_SECOND = 10**6
+NS_PER_TICK = 10**9 // TICKS_PER_SECOND
+
+# end_date=None (open epoch) sorts + compares after every real end date
+#   (start_date=None before every real start date)
+OPEN_END = 2**63 - 1
+OPEN_START = -2**63
+
+
+def to_ticks(date, open_value=OPEN_END):
+    """
+    :param date: UTCDateTime (or None = open)
+    :type date: obspy.UTCDateTime
+
+    :returns: date in int microseconds (open_value if date is None)
+    :rtype: int
+    """
+    return open_value if date is None else date.ns // NS_PER_TICK
+
+
+class EpochTable(object):
+    """
+    Array-backed table of epochs:
+        ids:    int64 rank of each epoch's id (self.id_names[rank] = id)
+        starts: int64 start microseconds (OPEN_START if no start_date)
+        ends:   int64 end microseconds (OPEN_END if no end_date)
+        refs:   whatever each row stands for (e.g., the Station/Channel object)
+
+        Ids can be anything hashable + sortable (e.g., 'IU.ANMO.00.BHZ' or
+        (istn, loc_code, cha_code)), epochs of the same id make up one group.
+
+        Sorting, overlap/gap detection and time-window selection are
+        numpy operations on the arrays: nothing compares UTCDateTimes
+        one pair at a time.
+    """
+
+    def __init__(self, ids, starts, ends, refs=None):
+        """
+        :param ids: id of each epoch
+        :type ids: list
+
+        :param starts: start of each epoch in microseconds (None = open)
+        :type starts: list
+
+        :param ends: end of each epoch in microseconds (None = open)
+        :type ends: list
+
+        :param refs: object each epoch stands for [default=row number]
+        :type refs: list
+        """
+        n = len(ids)
+        self.id_names = sorted(set(ids))
+        rank = {epoch_id: i for i, epoch_id in enumerate(self.id_names)}
+        self.ids = np.fromiter((rank[epoch_id] for epoch_id in ids), dtype=np.int64, count=n)
+        self.starts = np.fromiter((OPEN_START if start is None else start for start in starts),
+                                  dtype=np.int64, count=n)
+        self.ends = np.fromiter((OPEN_END if end is None else end for end in ends),
+                                dtype=np.int64, count=n)
+        self.refs = list(range(n)) if refs is None else list(refs)
+
+    @classmethod
+    def from_epochs(cls, epochs):
+        """
+        :param epochs: (id, start_date, end_date, ref) per epoch
+                       where the dates are UTCDateTime (or None = open)
+        :type epochs: list
+
+        :rtype: EpochTable
+        """
+        epochs = list(epochs)
+        return cls([epoch[0] for epoch in epochs],
+                   [to_ticks(epoch[1], None) for epoch in epochs],
+                   [to_ticks(epoch[2], None) for epoch in epochs],
+                   [epoch[3] for epoch in epochs])
+
+    def __len__(self):
+        return len(self.refs)
+
+    def epoch_id(self, i):
+        return self.id_names[self.ids[i]]
+
+    def sort(self):
+        """
+        Sort the rows (in place) by id then start (stable: ties keep their order)
+
+        :returns: self
+        :rtype: EpochTable
+        """
+        order = np.lexsort((self.starts, self.ids))
+        self.ids = self.ids[order]
+        self.starts = self.starts[order]
+        self.ends = self.ends[order]
+        self.refs = [self.refs[i] for i in order.tolist()]
+        return self
+
+    def _group_starts(self):
+        # True at the first row of each id group (rows must be sorted)
+        first = np.ones(len(self), dtype=bool)
+        first[1:] = self.ids[1:] != self.ids[:-1]
+        return first
+
+    def ordinals(self):
+        """
+        :returns: ordinal of each (sorted) row within its id group = its epoch index
+        :rtype: numpy.ndarray
+        """
+        rows = np.arange(len(self))
+        return rows - np.maximum.accumulate(np.where(self._group_starts(), rows, 0))
+
+    def neighbour_overlaps(self):
+        """
+        Compare each (sorted) epoch with the next one of the same id
+
+        :returns: reason per row i ('' if none) that epoch i overlaps epoch i+1:
+                  'same_start', 'unclosed' (epoch i is open) or 'overlap'
+        :rtype: numpy.ndarray of str
+        """
+        reasons = np.full(len(self), '', dtype='<U10')
+        if len(self) < 2:
+            return reasons
+        same_id = self.ids[1:] == self.ids[:-1]
+        next_start = self.starts[1:]
+        same_start = same_id & (self.starts[:-1] == next_start)
+        unclosed = same_id & ~same_start & (self.ends[:-1] == OPEN_END)
+        overlap = same_id & ~same_start & ~unclosed & (self.ends[:-1] > next_start)
+        reasons[:-1][overlap] = 'overlap'
+        reasons[:-1][unclosed] = 'unclosed'
+        reasons[:-1][same_start] = 'same_start'
+        return reasons
+
+    def sweep(self):
+        """
+        Check each (sorted) epoch against *all* the earlier epochs of its id,
+            not just its neighbour: against the latest end seen so far
+
+            overlap:  epoch starts before an earlier epoch ends
+            unclosed: an earlier epoch is open (no end_date)
+            gap:      epoch starts after every earlier epoch has ended
+
+        :returns: list of (type, row1, row2, seconds) where row1 = earlier epoch with the
+                  latest end, seconds = length of the overlap/gap (None for unclosed)
+        :rtype: list
+        """
+        n = len(self)
+        if n < 2:
+            return []
+        rows = np.arange(n)
+        first = self._group_starts()
+        group = np.cumsum(first) - 1
+
+        # Running max of the end within each group: rank the ends so that
+        #   group * nranks + rank increases from one group to the next
+        uniq_ends, end_rank = np.unique(self.ends, return_inverse=True)
+        key = group * len(uniq_ends) + end_rank.reshape(-1)
+        running = np.maximum.accumulate(key)
+        # Rows that raise the running max (first row of each group always does)
+        record = np.ones(n, dtype=bool)
+        record[1:] = key[1:] > running[:-1]
+        last_row = np.maximum.accumulate(np.where(record, rows, 0))
+
+        # Compare row i with the record row before it (only within a group)
+        i = rows[1:][~first[1:]]
+        prev = last_row[i - 1]
+        last_end = self.ends[prev]
+        start = self.starts[i]
+        end = self.ends[i]
+
+        types = np.full(len(i), '', dtype='<U8')
+        seconds = np.full(len(i), np.nan)
+        before = start < last_end
+        types[before & (last_end == OPEN_END)] = 'unclosed'
+        overlap = before & (last_end != OPEN_END)
+        types[overlap] = 'overlap'
+        seconds[overlap] = (np.minimum(last_end, end)[overlap] - start[overlap]) / TICKS_PER_SECOND
+        gap = start > last_end
+        types[gap] = 'gap'
+        seconds[gap] = (start[gap] - last_end[gap]) / TICKS_PER_SECOND
+
+        found = np.nonzero(types)[0]
+        return [(str(types[k]), int(prev[k]), int(i[k]), None if types[k] == 'unclosed' else float(seconds[k]))
+                for k in found.tolist()]
+
+    def window(self, starttime=None, endtime=None):
+        """
+        Select the epochs active at some time within [starttime, endtime]
+
+        :param starttime: microseconds (None = no lower bound)
+        :type starttime: int
+
+        :param endtime: microseconds (None = no upper bound)
+        :type endtime: int
+
+        :returns: True for each row that falls in the window
+        :rtype: numpy.ndarray of bool
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if starttime is not None:
+            mask &= self.ends >= starttime
+        if endtime is not None:
+            mask &= self.starts <= endtime
+        return mask
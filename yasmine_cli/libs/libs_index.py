@@ -0,0 +1,301 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import fnmatch
+import functools
+import itertools
+import re
+
+import logging
+logger = logging.getLogger()
+
+
+class CodeMatcher(object):
+    """
+    Compiled FDSN-style SNCL code pattern
+
+        A pattern is a comma separated list of codes, e.g., '00,10' or 'BH?,HH?'
+        Each code may use the wildcards:  *     = any run of characters
+                                          ?     = any single character
+                                          [EH]  = any character in the set ([!EH] = not in set)
+        '--' stands for the empty location code.
+
+        Literal codes go in a set (dict) for O(1) lookup, wildcard codes are
+        combined into a single precompiled regex.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        # Use dict as an insertion ordered set
+        self.literals = {}
+        regexes = []
+        for code in pattern.split(','):
+            code = code.strip()
+            if code == '--':
+                code = ''
+            if any(char in code for char in '*?['):
+                regexes.append(fnmatch.translate(code))
+            else:
+                self.literals[code] = None
+        self.regex = re.compile('|'.join(regexes)) if regexes else None
+
+    @property
+    def is_literal(self):
+        return self.regex is None
+
+    def match(self, code):
+        if code is None:
+            code = ''
+        if code in self.literals:
+            return True
+        return self.regex is not None and self.regex.match(code) is not None
+
+    def __repr__(self):
+        return "CodeMatcher(%r)" % self.pattern
+
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern):
+    """
+    Compile a SNCL code pattern (see CodeMatcher) once and cache it
+
+    :param pattern: code pattern, e.g., 'ANMO', 'BH?', '00,10', '[EH]H[ZNE]'
+                    None or '*' match everything
+    :type pattern: str
+
+    :returns: compiled matcher or None if pattern matches everything
+    :rtype: CodeMatcher
+    """
+    if pattern is None or pattern.strip() == '*':
+        return None
+    return CodeMatcher(pattern)
+
+
+def _matcher(pattern):
+    if pattern is None or isinstance(pattern, CodeMatcher):
+        return pattern
+    return compile_pattern(pattern)
+
+
+def get_index(xml_dict):
+    """
+    Return the SnclIndex of xml_dict, building it first if needed
+
+    :param xml_dict: python dict holding the metadata read from one xml file
+    :type xml_dict: dict
+
+    :returns: index of the base nodes in xml_dict
+    :rtype: SnclIndex
+    """
+    if 'index' not in xml_dict:
+        xml_dict['index'] = SnclIndex(xml_dict)
+    return xml_dict['index']
+
+
+class SnclIndex(object):
+    """
+    Index of the base nodes held in one xml_dict (see load_xmlfiles) keyed
+        by network, station and (location, channel) codes.
+
+        update/delete/select/add use it to go straight to the nodes that match
+        a scnl_filter instead of walking every channel epoch of every station.
+
+        The index only holds references into xml_dict. Whenever the structure
+        of xml_dict changes (network added/removed, station epochs or channels
+        added/removed/recoded) the matching add_network/remove_network/
+        reindex_station method must be called to keep it correct.
+
+        Channel entries are tuples: (istn, station, ichn, channel)
+            where istn = station epoch ordinal within net_dict['sta_codes'][sta_code]
+              and ichn = channel ordinal within station.channels
+    """
+
+    def __init__(self, xml_dict):
+        self.xml_dict = xml_dict
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        (Re)build the whole index from xml_dict
+        """
+        # net_code --> sta_code --> (loc_code, cha_code) --> [channel entries]
+        self.nets = {}
+        # sta_code --> {net_code: None} (dicts used as insertion ordered sets)
+        self.sta_nets = {}
+        # (loc_code, cha_code) --> {(net_code, sta_code): None}
+        self.cha_stas = {}
+
+        for net_code in self.xml_dict['net_codes']:
+            self.add_network(net_code)
+
+    def add_network(self, net_code):
+        """
+        Index network net_code (and all its stations) of xml_dict
+        """
+        self.remove_network(net_code)
+        self.nets[net_code] = {}
+        for sta_code in self.xml_dict['net_codes'][net_code]['sta_codes']:
+            self.reindex_station(net_code, sta_code)
+
+    def remove_network(self, net_code):
+        """
+        Remove network net_code (and all its stations) from the index
+        """
+        for sta_code in list(self.nets.get(net_code, {})):
+            self.remove_station(net_code, sta_code)
+        self.nets.pop(net_code, None)
+
+    def remove_station(self, net_code, sta_code):
+        """
+        Remove all epochs of station net_code.sta_code from the index
+        """
+        sta_index = self.nets.get(net_code, {}).pop(sta_code, None)
+        if sta_index is None:
+            return
+
+        net_codes = self.sta_nets[sta_code]
+        net_codes.pop(net_code, None)
+        if not net_codes:
+            del self.sta_nets[sta_code]
+
+        for key in sta_index:
+            stations = self.cha_stas[key]
+            stations.pop((net_code, sta_code), None)
+            if not stations:
+                del self.cha_stas[key]
+
+    def reindex_station(self, net_code, sta_code):
+        """
+        (Re)build the entries for all epochs of station net_code.sta_code
+            Call after its epochs or their channels are added, removed
+            or have their codes changed.
+        """
+        self.remove_station(net_code, sta_code)
+
+        net_dict = self.xml_dict['net_codes'].get(net_code)
+        if net_dict is None or sta_code not in net_dict['sta_codes']:
+            return
+
+        sta_index = {}
+        for istn, station in enumerate(net_dict['sta_codes'][sta_code]):
+            for ichn, channel in enumerate(station.channels):
+                key = (channel.location_code, channel.code)
+                sta_index.setdefault(key, []).append((istn, station, ichn, channel))
+
+        self.nets.setdefault(net_code, {})[sta_code] = sta_index
+        self.sta_nets.setdefault(sta_code, {})[net_code] = None
+        for key in sta_index:
+            self.cha_stas.setdefault(key, {})[(net_code, sta_code)] = None
+
+    def find_networks(self, net=None):
+        """
+        :param net: network code pattern [None = all networks]
+        :type net: str or CodeMatcher
+
+        :returns: list of matching net_codes
+        :rtype: list
+        """
+        net = _matcher(net)
+        if net is None:
+            return list(self.nets)
+        if net.is_literal:
+            return [net_code for net_code in net.literals if net_code in self.nets]
+        return [net_code for net_code in self.nets if net.match(net_code)]
+
+    def find_stations(self, net=None, sta=None):
+        """
+        :param net: network code pattern [None = all networks]
+        :type net: str or CodeMatcher
+
+        :param sta: station code pattern [None = all stations]
+        :type sta: str or CodeMatcher
+
+        :returns: list of matching (net_code, sta_code)
+        :rtype: list
+        """
+        net = _matcher(net)
+        sta = _matcher(sta)
+
+        if sta is not None and sta.is_literal:
+            return [(net_code, sta_code) for sta_code in sta.literals
+                                         for net_code in self.sta_nets.get(sta_code, ())
+                                         if net is None or net.match(net_code)]
+
+        return [(net_code, sta_code) for net_code in self.find_networks(net)
+                                     for sta_code in self.nets[net_code]
+                                     if sta is None or sta.match(sta_code)]
+
+    def find_channels(self, net=None, sta=None, loc=None, cha=None,
+                      stn_epoch=None, chn_epoch=None):
+        """
+        Find the channel epochs matching net.sta.loc.cha patterns (None = match all)
+            and, optionally, station/channel epoch ordinals
+
+        :returns: list of (net_code, sta_code, istn, station, ichn, channel)
+                  in (istn, ichn) order within each station
+        :rtype: list
+        """
+        net = _matcher(net)
+        sta = _matcher(sta)
+        loc = _matcher(loc)
+        cha = _matcher(cha)
+
+        # Only literal loc + cha codes --> exact (loc, cha) keys to look up
+        literal_keys = None
+        if loc is not None and loc.is_literal and cha is not None and cha.is_literal:
+            literal_keys = list(itertools.product(loc.literals, cha.literals))
+
+        if net is None and sta is None and literal_keys is not None:
+            stations = {}
+            for key in literal_keys:
+                stations.update(self.cha_stas.get(key, {}))
+        else:
+            stations = self.find_stations(net, sta)
+
+        matches = []
+        for net_code, sta_code in stations:
+            sta_index = self.nets[net_code][sta_code]
+            if literal_keys is not None:
+                keys = [key for key in literal_keys if key in sta_index]
+            else:
+                keys = [key for key in sta_index if (loc is None or loc.match(key[0])) and
+                                                    (cha is None or cha.match(key[1]))]
+            entries = []
+            for key in keys:
+                for (istn, station, ichn, channel) in sta_index[key]:
+                    if (stn_epoch is None or stn_epoch == istn) and \
+                       (chn_epoch is None or chn_epoch == ichn):
+                        entries.append((istn, station, ichn, channel))
+            entries.sort(key=lambda entry: (entry[0], entry[2]))
+            matches.extend((net_code, sta_code) + entry for entry in entries)
+
+        return matches
@@ -372,25 +372,298 @@ def _make_obj(obj_key, obj_dict):
 # MTH: Everything below here is a quick hack to override the hard-coded
 #      schema version (SCHEMA_VERSION = '1.1') in ObsPy inventory module.
 #      The only change is looking through kwargs for 'schema_version='
+#      _read_stationxml is the matching reader that starts from an
+#      already parsed lxml tree rather than from a file.
 
 from lxml import etree
 
-from obspy.io.stationxml.core import _write_network, _write_extra
-from obspy.io.stationxml.core import validate_stationxml
+from obspy.io.stationxml.core import _write_network, _write_station, _write_extra
+from obspy.io.stationxml.core import _read_network, _read_extra, _tag2obj, _read_response
+from obspy.core.inventory.response import Response
+
+from .libs_xml import validate_stationxml, schema_file
+
+import time
+import warnings
+
+import obspy
+from obspy.core.util.deprecation_helpers import ObsPyDeprecationWarning
+
+class LazyResponse(Response):
+    """
+    Channel response held as the raw <Response> XML (bytes) it was read from.
+
+        The obspy Response (stages, coefficients, FIR tables, ...) is only built,
+        once, the first time any of its attributes is read or set. Until then the
+        writer copies the raw XML through verbatim (see write_verbatim).
+    """
+
+    def __init__(self, raw, namespace):
+        # Response.__init__ is deliberately not called: any attribute lookup that
+        #   misses the (empty) instance dict goes through __getattr__ --> _load
+        self.__dict__['_raw'] = raw
+        self.__dict__['_namespace'] = namespace
+
+    @property
+    def is_loaded(self):
+        return '_raw' not in self.__dict__
+
+    def _load(self):
+        if self.is_loaded:
+            return
+        namespace = self.__dict__.pop('_namespace')
+        element = etree.fromstring(self.__dict__.pop('_raw'))
+
+        def _ns(tagname):
+            return "{%s}%s" % (namespace, tagname)
+
+        response = _read_response(element, _ns)
+        response._attempt_to_fix_units()
+        self.__dict__.update(response.__dict__)
+
+    def __getattr__(self, name):
+        # Only called when name isn't found the normal way
+        if name.startswith('__') or name in ('_raw', '_namespace') or self.is_loaded:
+            raise AttributeError(name)
+        self._load()
+        return getattr(self, name)
+
+    def __setattr__(self, name, value):
+        self._load()
+        super().__setattr__(name, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Response):
+            return False
+        if isinstance(other, LazyResponse) and not self.is_loaded and not other.is_loaded and \
+           self._raw == other._raw:
+            return True
+        self._load()
+        if isinstance(other, LazyResponse):
+            other._load()
+        return self.__dict__ == other.__dict__
+
+    def write_verbatim(self, channel_elem):
+        """
+        Append the raw (untouched) <Response> to channel_elem, with its tags in
+            the same (unqualified) form obspy's writer uses
+        """
+        namespace = "{%s}" % self._namespace
+        element = etree.fromstring(self._raw)
+        for elem in element.iter():
+            if isinstance(elem.tag, str) and elem.tag.startswith(namespace):
+                elem.tag = elem.tag[len(namespace):]
+        channel_elem.append(element)
+        etree.cleanup_namespaces(element)
+
+
+def _attach_lazy_responses(network_elem, network, namespace):
+    """
+    Give each channel of network (read at level='channel') a LazyResponse
+        holding the raw <Response> of the matching Channel element
+    """
+    def _ns(tagname):
+        return "{%s}%s" % (namespace, tagname)
+
+    for station, station_elem in zip(network.stations, network_elem.findall(_ns("Station"))):
+        for channel, channel_elem in zip(station.channels, station_elem.findall(_ns("Channel"))):
+            response = channel_elem.find(_ns("Response"))
+            if response is not None:
+                channel.response = LazyResponse(etree.tostring(response, with_tail=False), namespace)
+
+
+# Placeholder for a network's stations when splitting its raw xml into head/foot
+STATIONS_MARKER = b'<!--yasmine:stations-->'
+
+def _raw_xml(element, namespace):
+    """
+    Serialize element (w/o its tail) as it appears in the input, less the default
+        namespace declaration (already made by the output root element)
+    """
+    raw = etree.tostring(element, with_tail=False)
+    end = raw.index(b'>')
+    return raw[:end].replace(b' xmlns="%s"' % namespace.encode(), b'', 1) + raw[end:]
+
+
+def _attach_raw_xml(network_elem, network, namespace):
+    """
+    Keep the input xml of network (head + foot around its stations) and of each
+        of its stations on the obspy objects (as ._raw_xml) so that the writer can
+        copy them through untouched. See mark_modified.
+    """
+    def _ns(tagname):
+        return "{%s}%s" % (namespace, tagname)
+
+    station_elems = network_elem.findall(_ns("Station"))
+
+    # Whitespace that precedes the first station separates stations on output
+    sep = b"\n    "
+    if station_elems:
+        previous = station_elems[0].getprevious()
+        whitespace = previous.tail if previous is not None else network_elem.text
+        if whitespace and not whitespace.strip():
+            sep = whitespace.encode()
+
+    header = etree.Element(network_elem.tag, network_elem.attrib, nsmap=network_elem.nsmap)
+    header.text = network_elem.text
+    for child in network_elem:
+        if child.tag != _ns("Station"):
+            header.append(copy.deepcopy(child))
+    marker = etree.Comment(STATIONS_MARKER[4:-3].decode())
+    marker.tail = network_elem[-1].tail if len(network_elem) else None
+    header.append(marker)
+    head, foot = _raw_xml(header, namespace).split(STATIONS_MARKER)
+    network._raw_xml = (head, sep, foot)
+
+    for station, station_elem in zip(network.stations, station_elems):
+        station._raw_xml = _raw_xml(station_elem, namespace)
+
+
+def mark_modified(node):
+    """
+    Flag a Network/Station as modified: drop the input xml kept for it so that
+        it is re-serialized (from the obspy object) on output.
+        Changes to a Channel (or its Response) must mark the Station holding it.
+
+    :param node: base node that was modified
+    :type node: obspy Network or Station
+    """
+    node.__dict__.pop('_raw_xml', None)
+
+
+def _read_stationxml(tree_or_root, level='response', lazy_responses=False, passthrough=False):
+    """
+    Creates an inventory object from an already parsed StationXML tree.
+
+        Same as ObsPy's stationxml reader except that it takes the lxml tree
+        (or root element) built once at ingest, so that the input file does
+        not have to be parsed again.
+
+    :param tree_or_root: Parsed StationXML document
+    :type tree_or_root: lxml.etree._ElementTree or lxml.etree._Element
+    :type level: str
+    :param level: Level of detail to read from file. One of ``'response'``,
+        ``'channel'``, ``'station'`` or ``'network'``.
+    :type lazy_responses: bool
+    :param lazy_responses: If True (and level='response'), keep each channel
+        response as raw XML in a LazyResponse that is only parsed on first use.
+    :type passthrough: bool
+    :param passthrough: If True (and level='response'), keep the input xml of
+        each network + station so untouched ones are copied through on output.
+
+    :returns: Inventory object created from the tree
+    :rtype: obspy.core.inventory.inventory
+    """
+
+    if isinstance(tree_or_root, etree._ElementTree):
+        root = tree_or_root.getroot()
+    else:
+        root = tree_or_root
+
+    namespace = "http://www.fdsn.org/xml/station/1"
+
+    stationxml_version = root.attrib.get('schemaVersion')
+
+    def _ns(tagname):
+        return "{%s}%s" % (namespace, tagname)
+
+    # Source and Created field must exist in a StationXML.
+    source = root.find(_ns("Source")).text
+    created = obspy.UTCDateTime(root.find(_ns("Created")).text)
+
+    # These are optional
+    sender = _tag2obj(root, _ns("Sender"), str)
+    module = _tag2obj(root, _ns("Module"), str)
+    module_uri = _tag2obj(root, _ns("ModuleURI"), str)
+
+    networks = []
+    with warnings.catch_warnings():
+        if stationxml_version == '1.0':
+            warnings.filterwarnings(
+                'ignore',
+                'Setting Numerator/Denominator with a unit is deprecated.',
+                ObsPyDeprecationWarning)
+        for network in root.findall(_ns("Network")):
+            if lazy_responses and level == 'response':
+                networks.append(_read_network(network, _ns, 'channel'))
+                _attach_lazy_responses(network, networks[-1], namespace)
+            else:
+                networks.append(_read_network(network, _ns, level))
+            if passthrough and level == 'response':
+                _attach_raw_xml(network, networks[-1], namespace)
+
+    inv = obspy.core.inventory.Inventory(networks=networks, source=source,
+                                         sender=sender, created=created,
+                                         module=module, module_uri=module_uri)
+    _read_extra(root, inv)  # read extra tags from root element
+    return inv
+
+
+def _write_header(parent, inventory, **kwargs):
+    """
+    Write the FDSNStationXML header elements (Source ... Created) under parent
+    """
+    etree.SubElement(parent, "Source").text = inventory.source
+    if inventory.sender:
+        etree.SubElement(parent, "Sender").text = inventory.sender
+
+    # Undocumented flag that does not write the module flags. Useful for
+    # testing. It is undocumented because it should not be used publicly.
+    if kwargs.get("_suppress_module_tags", False):
+        pass
+    else:
+        etree.SubElement(parent, "Module").text = inventory.module
+        etree.SubElement(parent, "ModuleURI").text = inventory.module_uri
+
+    etree.SubElement(parent, "Created").text = str(inventory.created)
+
+
+def _validate_chunk(elements, inventory, attrib, nsmap, schemafile, **kwargs):
+    """
+    Validate a chunk (e.g., a single Network) of the output document in memory.
+        The elements are wrapped in a minimal FDSNStationXML root + header and their
+        (unqualified) tags are temporarily qualified with the StationXML namespace,
+        so the tree can be checked directly against the cached compiled schema
+        without being serialized + parsed again. The tags are restored afterwards.
+
+    :returns: (valid, errors)
+    :rtype: tuple
+    """
+    namespace = nsmap[None]
+    chunk = etree.Element("{%s}FDSNStationXML" % namespace, attrib=attrib, nsmap=nsmap)
+    _write_header(chunk, inventory, **kwargs)
+    for element in elements:
+        chunk.append(element)
+
+    qualified = [element for element in chunk.iter()
+                 if isinstance(element.tag, str) and element.tag[0] != '{']
+    for element in qualified:
+        element.tag = "{%s}%s" % (namespace, element.tag)
+    try:
+        return validate_stationxml(chunk, schemafile)
+    finally:
+        for element in qualified:
+            element.tag = etree.QName(element).localname
 
-import io
 
 def _write_stationxml(inventory, file_or_file_object, validate=False,
                       nsmap=None, level="response", **kwargs):
     """
     Writes an inventory object to a buffer.
+
+    The document is streamed: the root start tag and header are
+    written first and then each network is built, (validated) and written
+    one at a time, so that memory stays roughly constant per network rather
+    than holding the whole output tree.
+
     :type inventory: :class:`~obspy.core.inventory.Inventory`
     :param inventory: The inventory instance to be written.
     :param file_or_file_object: The file or file-like object to be written to.
     :type validate: bool
-    :param validate: If True, the created document will be validated with the
-        StationXML schema before being written. Useful for debugging or if you
-        don't trust ObsPy. Defaults to False.
+    :param validate: If True, each network (chunk) of the created document will
+        be validated with the StationXML schema before being written. Useful
+        for debugging or if you don't trust ObsPy. Defaults to False.
+        If validation fails, an output file (path) is removed.
     :type nsmap: dict
     :param nsmap: Additional custom namespace abbreviation mappings
         (e.g. `{"edb": "http://erdbeben-in-bayern.de/xmlns/0.1"}`).
@@ -414,57 +687,218 @@ def _write_stationxml(inventory, file_or_file_object, validate=False,
     nsmap[None] = "http://www.fdsn.org/xml/station/1"
     attrib = {"schemaVersion": SCHEMA_VERSION}
 
-    root = etree.Element("FDSNStationXML", attrib=attrib, nsmap=nsmap)
+    if level not in ["network", "station", "channel", "response"]:
+        raise ValueError("Requested stationXML write level is unsupported.")
 
-    etree.SubElement(root, "Source").text = inventory.source
-    if inventory.sender:
-        etree.SubElement(root, "Sender").text = inventory.sender
+    # Register all namespaces with the tree. This allows for
+    # additional namespaces to be added to an inventory that
+    # was not created by reading a StationXML file.
+    for prefix, ns in nsmap.items():
+        if prefix and ns:
+            etree.register_namespace(prefix, ns)
 
-    # Undocumented flag that does not write the module flags. Useful for
-    # testing. It is undocumented because it should not be used publicly.
-    if kwargs.get("_suppress_module_tags", False):
-        pass
+    schemafile = schema_file(SCHEMA_VERSION) if validate is True else None
+
+    t0 = time.perf_counter()
+    if isinstance(file_or_file_object, (str, bytes, os.PathLike)):
+        try:
+            with open(file_or_file_object, 'wb') as fh:
+                validate_time = _stream_stationxml(inventory, fh, attrib, nsmap, level, schemafile, **kwargs)
+        except Exception:
+            if os.path.exists(file_or_file_object):
+                os.remove(file_or_file_object)
+            raise
     else:
-        etree.SubElement(root, "Module").text = inventory.module
-        etree.SubElement(root, "ModuleURI").text = inventory.module_uri
+        validate_time = _stream_stationxml(inventory, file_or_file_object, attrib, nsmap, level,
+                                           schemafile, **kwargs)
+    total_time = time.perf_counter() - t0
 
-    etree.SubElement(root, "Created").text = str(inventory.created)
+    if schemafile:
+        logger.info("_write_stationxml: validate=%.3f s write=%.3f s" % (validate_time, total_time - validate_time))
+    else:
+        logger.info("_write_stationxml: write=%.3f s (not validated)" % total_time)
 
-    if level not in ["network", "station", "channel", "response"]:
-        raise ValueError("Requested stationXML write level is unsupported.")
 
-    for network in inventory.networks:
-        _write_network(root, network, level)
+def _write_station_verbatim(parent, station, level):
+    """
+    Same as obspy's _write_station except that untouched (never loaded)
+        LazyResponses are copied through verbatim from their raw XML
+    """
+    lazy = []
+    if level == "response":
+        lazy = [channel for channel in station.channels
+                if isinstance(channel.response, LazyResponse) and not channel.response.is_loaded]
+
+    responses = [channel.response for channel in lazy]
+    try:
+        for channel in lazy:
+            channel.response = None
+        _write_station(parent, station, level)
+    finally:
+        for channel, response in zip(lazy, responses):
+            channel.response = response
+
+    if not lazy:
+        return
+
+    lazy_ids = {id(channel) for channel in lazy}
+    station_elem = parent[-1]
+    for channel, channel_elem in zip(station.channels, station_elem.iterfind("Channel")):
+        if id(channel) in lazy_ids:
+            channel.response.write_verbatim(channel_elem)
+
+
+def _write_network_verbatim(parent, network, level):
+    """
+    Same as obspy's _write_network except that untouched (never loaded)
+        LazyResponses are copied through verbatim from their raw XML
+    """
+    _write_network(parent, network, "network")
+    if level == "network":
+        return
+    network_elem = parent[-1]
+    for station in network.stations:
+        _write_station_verbatim(network_elem, station, level)
 
-    # Add custom namespace tags to root element
-    _write_extra(root, inventory)
 
-    tree = root.getroottree()
-
-    # The validation has to be done after parsing once again so that the
-    # namespaces are correctly assembled.
-    if validate is True:
-        buf = io.BytesIO()
-        tree.write(buf)
-        buf.seek(0)
-        # This works since ObsPy validate_stationxml gets version from the xml
-        validates, errors = validate_stationxml(buf)
-        buf.close()
+def _has_raw_xml(network):
+    return hasattr(network, '_raw_xml') or any(hasattr(station, '_raw_xml') for station in network.stations)
+
+
+def _network_passthrough(network, level, validate):
+    """
+    Serialize network (bytes), copying the input xml of its header and of each
+        station that was not modified (see mark_modified) through untouched.
+        Only the modified parts are built by obspy (and validated).
+
+    :param validate: validate(parent, what) callback of the writer
+    :type validate: function
+
+    :returns: xml of the network
+    :rtype: bytes
+    """
+    parent = etree.Element("FDSNStationXML")
+    _write_network(parent, network, "network")
+    network_elem = parent[-1]
+
+    modified = []
+    for station in network.stations:
+        if not hasattr(station, '_raw_xml'):
+            _write_station_verbatim(network_elem, station, level)
+            modified.append(network_elem[-1])
+    logger.info("Net:%s passthrough: %d station epochs re-serialized, %d copied through%s" %
+                (network.code, len(modified), len(network.stations) - len(modified),
+                 "" if hasattr(network, '_raw_xml') else " (network modified)"))
+
+    validate(parent, "network:%s" % network.code)
+
+    modified_xml = []
+    for station_elem in modified:
+        network_elem.remove(station_elem)
+        etree.indent(station_elem, space="  ", level=2)
+        modified_xml.append(etree.tostring(station_elem, with_tail=False))
+
+    if hasattr(network, '_raw_xml'):
+        head, sep, foot = network._raw_xml
+    else:
+        network_elem.append(etree.Comment(STATIONS_MARKER[4:-3].decode()))
+        etree.indent(network_elem, space="  ", level=1)
+        head, foot = etree.tostring(network_elem, with_tail=False).split(STATIONS_MARKER)
+        sep = b"\n    "
+
+    modified_xml = iter(modified_xml)
+    stations = [station._raw_xml if hasattr(station, '_raw_xml') else next(modified_xml)
+                for station in network.stations]
+
+    return head + sep.join(stations) + foot
+
+
+def _stream_stationxml(inventory, fh, attrib, nsmap, level, schemafile, **kwargs):
+    """
+    Stream inventory to the (binary) file object fh, one network at a time.
+        Each top-level element is built under a throwaway parent (declaring the
+        namespaces of the root), indented to match pretty_print output of the
+        full tree and then written.
+
+    :param schemafile: If set, validate each chunk against this schema before writing it
+    :type schemafile: str
+
+    :returns: Time (s) spent validating
+    :rtype: float
+    """
+
+    validate_time = 0.
+
+    # Custom namespace attributes of the root element (inventory.extra of type
+    #   attribute) must be known before the root element is opened
+    root = etree.Element("FDSNStationXML", attrib=attrib, nsmap=nsmap)
+    _write_extra(root, inventory)
+    del root[:]         # extra elements are written after the networks
+    attrib = dict(root.attrib)
+    # (+ the prefixes lxml made up for their namespaces, if not in nsmap)
+    nsmap = dict(nsmap, **{prefix: uri for prefix, uri in root.nsmap.items() if prefix not in nsmap})
+
+    def _validate(parent, what):
+        nonlocal validate_time
+        if schemafile is None:
+            return
+        t0 = time.perf_counter()
+        elements = list(parent)
+        validates, errors = _validate_chunk(elements, inventory, attrib, nsmap, schemafile, **kwargs)
+        # Move the elements back under their (unnamespaced) parent so they serialize as before
+        parent.extend(elements)
+        validate_time += time.perf_counter() - t0
         if validates is False:
-            msg = "The created file fails to validate.\n"
+            msg = "The created file fails to validate (%s).\n" % what
             for err in errors:
                 msg += "\t%s\n" % err
             raise Exception(msg)
 
-    # Register all namespaces with the tree. This allows for
-    # additional namespaces to be added to an inventory that
-    # was not created by reading a StationXML file.
-    for prefix, ns in nsmap.items():
-        if prefix and ns:
-            etree.register_namespace(prefix, ns)
+    def _parent():
+        # Throwaway parent declaring the namespaces of the root element, so that
+        #   the elements built under it don't redeclare them when serialized
+        return etree.Element("FDSNStationXML", nsmap=nsmap)
+
+    def _write(parent):
+        if not len(parent):
+            return
+        etree.indent(parent, space="  ")
+        parent[-1].tail = None
+        xml = etree.tostring(parent, encoding="UTF-8", xml_declaration=False)
+        # The elements, less the start/end tags of parent
+        fh.write(xml[xml.index(b">") + 1:xml.rindex(b"</")])
+
+    # Root start tag exactly as obspy's writer would serialize it (same attrib + nsmap order)
+    start_tag = etree.tostring(root, encoding="UTF-8", xml_declaration=False)
+    fh.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+    fh.write(start_tag[:-len(b"/>")] + b">")
+
+    parent = _parent()
+    _write_header(parent, inventory, **kwargs)
+    _write(parent)
 
-    tree.write(file_or_file_object, pretty_print=True, xml_declaration=True,
-               encoding="UTF-8")
+    for network in inventory.networks:
+        if level == "response" and _has_raw_xml(network):
+            raw = _network_passthrough(network, level, _validate)
+            fh.write(b"\n  " + raw)
+            continue
+        parent = _parent()
+        _write_network_verbatim(parent, network, level)
+        _validate(parent, "network:%s" % network.code)
+        _write(parent)
+
+    # Add custom namespace tags to root element (its attributes are already set)
+    parent = _parent()
+    _write_extra(parent, inventory)
+    if len(parent):
+        # The schema wants a Network ahead of them: validate behind a placeholder
+        parent.insert(0, etree.Element("Network", code="XX"))
+        _validate(parent, "root extra")
+        del parent[0]
+        _write(parent)
+    fh.write(b"\n</FDSNStationXML>\n")
+
+    return validate_time
 
 
 if __name__ == '__main__':
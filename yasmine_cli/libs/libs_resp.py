@@ -0,0 +1,303 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import csv
+import hashlib
+import json
+import pickle
+import sys
+
+import numpy as np
+
+from obspy.core.inventory.response import (PolesZerosResponseStage, CoefficientsTypeResponseStage,
+                                           FIRResponseStage, ResponseListResponseStage,
+                                           PolynomialResponseStage)
+
+from .libs_obs import LazyResponse
+from .plot_poly_resp import is_polynomial_resp, polynomial_gain_mismatch
+
+import logging
+logger = logging.getLogger()
+
+# Shared frequency grid (Hz) every unique stage chain is evaluated on
+#   (+ the reference frequencies of all channel sensitivities)
+FREQ_MIN = 1.e-3
+FREQ_MAX = 1.e2
+FREQ_POINTS = 101
+
+SENSITIVITY_TOLERANCE = 0.05
+
+REPORT_FIELDS = ['network', 'station', 'location', 'channel', 'start_date', 'end_date',
+                 'input_units', 'frequency', 'reported', 'computed', 'rel_error', 'status', 'chain']
+
+
+def stage_key(stage):
+    """
+    Hash of a response stage, ignoring its position in the chain (stage_sequence_number):
+        identical stages (e.g., the same FIR filter) used by many channels are evaluated once
+    """
+    attrs = {key: value for key, value in stage.__dict__.items() if key != 'stage_sequence_number'}
+    return hashlib.sha256(pickle.dumps((type(stage).__name__, attrs), protocol=4)).hexdigest()
+
+
+def evaluate_stage(stage, freqs):
+    """
+    Complex response of one stage (stage_gain included) at each of freqs, as evalresp would compute it:
+
+        PolesZeros:    gain * A0 * prod(s - zeros) / prod(s - poles), s = i*2*pi*f (RADIANS/SECOND) or i*f (HERTZ)
+                       -or- z = exp(i*2*pi*f/fs) (DIGITAL (Z-TRANSFORM))
+        Coefficients:  gain * sum(n[k] * x^-k) / sum(d[k] * x^-k), x = z (DIGITAL) -or- gain * N(s)/D(s) (ANALOG)
+        FIR:           gain * sum(h[k] * z^-k) with the symmetric half of h expanded
+        ResponseList:  amplitude/phase interpolated from the list
+        Other stages:  gain only
+
+    Decimation delay/correction (phase only) is not applied.
+
+    :param stage: obspy response stage
+    :type stage: obspy.core.inventory.response.ResponseStage
+
+    :param freqs: frequencies (Hz)
+    :type freqs: numpy.ndarray
+
+    :returns: complex response at freqs -or- None if the stage can't be evaluated
+    :rtype: numpy.ndarray
+    """
+    gain = stage.stage_gain if stage.stage_gain is not None else 1.
+    ones = np.ones(freqs.shape, dtype=complex)
+
+    def _z():
+        if not stage.decimation_input_sample_rate:
+            return None
+        return np.exp(2j * np.pi * freqs / stage.decimation_input_sample_rate)
+
+    def _poly(coefficients, x):
+        # sum(c[k] * x^-k)
+        coefficients = np.asarray([float(c) for c in coefficients], dtype=float)
+        if coefficients.size == 0:
+            return ones
+        return np.polynomial.polynomial.polyval(1. / x, coefficients)
+
+    if isinstance(stage, PolesZerosResponseStage):
+        zeros = np.asarray([complex(z) for z in stage.zeros], dtype=complex)
+        poles = np.asarray([complex(p) for p in stage.poles], dtype=complex)
+        pz_type = stage.pz_transfer_function_type
+        if pz_type == 'LAPLACE (RADIANS/SECOND)':
+            x = 2j * np.pi * freqs
+        elif pz_type == 'LAPLACE (HERTZ)':
+            x = 1j * freqs
+        else:       # DIGITAL (Z-TRANSFORM)
+            x = _z()
+            if x is None:
+                return None
+        h = np.prod(x[:, None] - zeros[None, :], axis=1) / np.prod(x[:, None] - poles[None, :], axis=1)
+        return gain * stage.normalization_factor * h
+
+    if isinstance(stage, CoefficientsTypeResponseStage):
+        if stage.cf_transfer_function_type == 'DIGITAL':
+            x = _z()
+            if x is None:
+                # No sample rate: only (frequency independent) single coefficient stages can be evaluated
+                if len(stage.numerator) > 1 or len(stage.denominator) > 1:
+                    return None
+                x = ones
+        else:
+            x = 2j * np.pi * freqs if stage.cf_transfer_function_type == 'ANALOG (RADIANS/SECOND)' else 1j * freqs
+            x = 1. / x      # N(s)/D(s) = sum(n[k] * s^k) / ...
+        return gain * _poly(stage.numerator, x) / _poly(stage.denominator, x)
+
+    if isinstance(stage, FIRResponseStage):
+        h = [float(c) for c in stage.coefficients]
+        if stage.symmetry == 'EVEN':
+            h = h + h[::-1]
+        elif stage.symmetry == 'ODD':
+            h = h + h[-2::-1]
+        x = _z()
+        if x is None:
+            return None if h else gain * ones
+        return gain * _poly(h, x)
+
+    if isinstance(stage, ResponseListResponseStage):
+        elements = sorted(stage.response_list_elements, key=lambda e: e.frequency)
+        f = np.asarray([e.frequency for e in elements], dtype=float)
+        amp = np.interp(freqs, f, [e.amplitude for e in elements])
+        phase = np.interp(freqs, f, [e.phase for e in elements])
+        return amp * np.exp(1j * np.radians(phase))
+
+    if isinstance(stage, PolynomialResponseStage):
+        return None
+
+    return gain * ones
+
+
+class ResponseEvaluator(object):
+    """
+    Evaluate many channel responses on one shared frequency grid.
+
+        Each unique stage is evaluated once (vectorized over the whole grid) and each unique
+        chain of stages once (product of its stages), no matter how many channels share them
+    """
+
+    def __init__(self, freqs):
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.stages = {}
+        self.chains = {}
+
+    def chain_key(self, response):
+        if isinstance(response, LazyResponse):
+            response._load()
+        return tuple(stage_key(stage) for stage in response.response_stages)
+
+    def evaluate(self, response):
+        """
+        :returns: chain key, complex response of the whole chain at self.freqs (None if it can't be evaluated)
+        :rtype: tuple, numpy.ndarray
+        """
+        key = self.chain_key(response)
+        if key not in self.chains:
+            h = np.ones(self.freqs.shape, dtype=complex)
+            for stage, skey in zip(response.response_stages, key):
+                if skey not in self.stages:
+                    self.stages[skey] = evaluate_stage(stage, self.freqs)
+                if self.stages[skey] is None:
+                    h = None
+                    break
+                h = h * self.stages[skey]
+            self.chains[key] = h
+        return key, self.chains[key]
+
+
+def check_responses(inventory, tolerance=SENSITIVITY_TOLERANCE):
+    """
+    Compare the sensitivity computed from each channel's stages with its InstrumentSensitivity
+
+    :param inventory: Inventory whose channel responses to check
+    :type inventory: obspy.core.inventory.inventory
+
+    :param tolerance: Max relative difference |computed - reported| / reported before a channel is flagged
+    :type tolerance: float
+
+    :returns: report dict: {'tolerance', 'channels', 'unique_chains', 'flagged', 'frequencies',
+                            'chains': {id: {'amplitude': [], 'phase': []}}, 'results': [row per channel]}
+    :rtype: dict
+    """
+    channels = [(network, station, channel) for network in inventory.networks
+                for station in network.stations for channel in station.channels]
+
+    ref_freqs = set()
+    for network, station, channel in channels:
+        sensitivity = channel.response.instrument_sensitivity if channel.response else None
+        if sensitivity is not None and sensitivity.frequency is not None:
+            ref_freqs.add(float(sensitivity.frequency))
+    grid = np.logspace(np.log10(FREQ_MIN), np.log10(FREQ_MAX), FREQ_POINTS)
+    freqs = np.unique(np.concatenate([grid, sorted(ref_freqs)]))
+    evaluator = ResponseEvaluator(freqs)
+
+    chain_ids = {}
+    results = []
+    for network, station, channel in channels:
+        response = channel.response
+        sensitivity = response.instrument_sensitivity if response else None
+        row = {'network': network.code, 'station': station.code, 'location': channel.location_code,
+               'channel': channel.code,
+               'start_date': str(channel.start_date) if channel.start_date else None,
+               'end_date': str(channel.end_date) if channel.end_date else None,
+               'input_units': None, 'frequency': None, 'reported': None, 'computed': None,
+               'rel_error': None, 'status': None, 'chain': None}
+        results.append(row)
+
+        if response is None or not response.response_stages:
+            row['status'] = 'no_response'
+            continue
+
+        if is_polynomial_resp(response):
+            row['input_units'] = response.instrument_polynomial.input_units
+            row['rel_error'] = polynomial_gain_mismatch(response)
+            row['status'] = 'ok' if row['rel_error'] <= tolerance else 'polynomial_mismatch'
+            continue
+
+        key, h = evaluator.evaluate(response)
+        if key not in chain_ids:
+            chain_ids[key] = len(chain_ids)
+        row['chain'] = chain_ids[key]
+
+        if sensitivity is None or not sensitivity.value or sensitivity.frequency is None:
+            row['status'] = 'no_sensitivity'
+            continue
+        row['input_units'] = sensitivity.input_units
+        row['frequency'] = float(sensitivity.frequency)
+        row['reported'] = float(sensitivity.value)
+        if h is None:
+            row['status'] = 'unsupported'
+            continue
+
+        i = np.searchsorted(freqs, row['frequency'])
+        row['computed'] = float(np.abs(h[i]))
+        row['rel_error'] = abs(row['computed'] - row['reported']) / abs(row['reported'])
+        row['status'] = 'ok' if row['rel_error'] <= tolerance else 'mismatch'
+
+    chains = {}
+    for key, i in chain_ids.items():
+        h = evaluator.chains[key]
+        if h is not None:
+            chains[i] = {'amplitude': np.abs(h).tolist(), 'phase': np.degrees(np.unwrap(np.angle(h))).tolist()}
+
+    flagged = [row for row in results if row['status'] != 'ok']
+    logger.info("check_responses: %d channels, %d unique stage chains (%d unique stages), %d flagged" %
+                (len(results), len(chain_ids), len(evaluator.stages), len(flagged)))
+    for row in flagged:
+        logger.warning("check_responses: %s.%s.%s.%s [%s - %s] status=%s reported=%s computed=%s rel_error=%s" %
+                       (row['network'], row['station'], row['location'], row['channel'], row['start_date'],
+                        row['end_date'], row['status'], row['reported'], row['computed'], row['rel_error']))
+
+    return {'tolerance': tolerance, 'channels': len(results), 'unique_chains': len(chain_ids),
+            'flagged': len(flagged), 'frequencies': freqs.tolist(), 'chains': chains, 'results': results}
+
+
+def write_report(report, outfile=None):
+    """
+    Write the check_responses report as json (outfile ends in .json) -or- csv (one row per channel)
+
+    :param outfile: Path to report [default=stdout, csv]
+    :type outfile: str
+    """
+    fh = open(outfile, 'w', newline='') if outfile else sys.stdout
+    try:
+        if outfile and outfile.endswith('.json'):
+            json.dump(report, fh, indent=1)
+            fh.write('\n')
+        else:
+            writer = csv.DictWriter(fh, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(report['results'])
+    finally:
+        if outfile:
+            fh.close()
@@ -0,0 +1,314 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import contextlib
+import copy
+import io
+import json
+import os
+import socket
+import socketserver
+import time
+
+import sys
+
+import logging
+logger = logging.getLogger()
+
+from ..yasmine_client import default_socket
+from .libs_util import processCmdLine, op_to_argv
+from .libs_obs import _write_stationxml
+from .edit_xml_to_inv import read_xml_list, apply_operations, pack_xml_list_to_inv, print_all
+from .edit_xml_to_inv import needs_epoch_order, sort_epochs
+
+
+class ErrorCollector(logging.Handler):
+    '''
+    Collect the ERROR messages logged while handling one request so they can be
+        returned to the client (the server's own log still gets them too).
+        They are reported only: whether the request failed is decided by its
+        exit status, exactly like yasmine-cli.
+    '''
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def working_copy(xml_list):
+    '''
+    Copy of the resident xml_list for one request to work on.
+        Channel responses (the bulk of the memory, only ever replaced, never
+        modified in place) are shared with the resident copy. The index is
+        left out: it is rebuilt on first use.
+
+    :param xml_list: List of python dicts containing metadata
+    :type xml_list: list
+
+    :returns: copy of xml_list
+    :rtype: list
+    '''
+    memo = {}
+    for xml_dict in xml_list:
+        for net_dict in xml_dict['net_codes'].values():
+            for station_epochs in net_dict['sta_codes'].values():
+                for station in station_epochs:
+                    for channel in station.channels:
+                        if channel.response is not None:
+                            memo[id(channel.response)] = channel.response
+
+    return [copy.deepcopy({key: value for key, value in xml_dict.items() if key != 'index'}, memo)
+            for xml_dict in xml_list]
+
+
+def only_filters_output(args):
+    '''
+    True if the request (or any of its --batch operations) is a select:
+        it narrows down what is written back, not the resident inventory
+    '''
+    ops = [op_args for (op_args, op_filter) in args.batch_ops] if args.action == 'batch' else [args]
+    return any(op.action == 'select' for op in ops)
+
+
+class YasmineServer(socketserver.UnixStreamServer):
+    '''
+    Keeps the inventory (xml_list) resident in memory between requests.
+        Requests are handled one at a time, in the order they arrive, so each
+        operation sees the result of the previous one.
+
+        Each request works on a copy of the resident inventory that only replaces
+        it once the request has succeeded (written + validated, without exiting
+        with an error): a failed request leaves nothing half applied behind, and
+        select/print requests never change the resident inventory.
+    '''
+
+    def __init__(self, socket_path, args):
+        self.socket_path = socket_path
+        self.load_args = None
+        self.xml_list = None
+        self.schema_version = None
+        self.running = True
+
+        # Load before binding: a failed load must not leave a socket behind
+        if args.infiles:
+            self.load(args)
+
+        # Only the owner may connect to the socket
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, YasmineRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def load(self, args):
+        '''
+        (Re)load args.infiles from disk, replacing the resident inventory
+        '''
+        t0 = time.perf_counter()
+        self.xml_list, self.schema_version = read_xml_list(args)
+        self.load_args = args
+        logger.info("serve: loaded infiles=%s in %.3f s" % (args.infiles, time.perf_counter() - t0))
+
+    def dispatch(self, request):
+        '''
+        Handle one request and return the response
+
+        :param request: {'command': 'edit', 'argv': [...], 'cwd': path} -or- {'command': 'edit', 'op': {...}}
+                        -or- {'command': ping/reload/shutdown}
+        :type request: dict
+
+        :returns: {'ok': bool, 'output': xml str, 'stdout': str, 'stderr': str, 'errors': [msgs]}
+                  ok is False if the request exited with an error (like yasmine-cli's exit status 2)
+        :rtype: dict
+        '''
+        response = {'ok': True, 'output': None, 'stdout': '', 'stderr': '', 'errors': []}
+
+        command = request.get('command', 'edit')
+        if command == 'ping':
+            response['stdout'] = "yasmine-cli serve: infiles=%s\n" % \
+                                 (self.load_args.infiles if self.load_args else None)
+            return response
+        if command == 'shutdown':
+            self.running = False
+            return response
+        if command not in ('reload', 'edit'):
+            response['ok'] = False
+            response['errors'].append("Unknown command:%s" % command)
+            return response
+
+        errors = ErrorCollector()
+        stdout = io.StringIO()
+        stderr = io.StringIO()      # e.g., argparse usage errors
+        cwd = os.getcwd()
+        logger.addHandler(errors)
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                if request.get('cwd'):
+                    os.chdir(request['cwd'])
+                if command == 'reload':
+                    if self.load_args is None:
+                        logger.error("Nothing to reload: no --infiles loaded yet")
+                        sys.exit(2)
+                    self.load(self.load_args)
+                else:
+                    argv = request['argv'] if 'argv' in request else op_to_argv(request.get('op', {}))
+                    response['output'] = self.edit(argv)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                response['ok'] = False
+        except Exception as e:
+            logger.error("serve: request failed: %r" % e)
+            response['ok'] = False
+        finally:
+            os.chdir(cwd)
+            logger.removeHandler(errors)
+
+        response['stdout'] = stdout.getvalue()
+        response['stderr'] = stderr.getvalue()
+        response['errors'] = errors.messages
+        return response
+
+    def edit(self, argv):
+        '''
+        Apply the yasmine-cli options in argv to the resident inventory
+
+        :returns: The modified StationXML (if not written to --output), else None
+        :rtype: str
+        '''
+        fname = 'yasmine-cli serve'
+        # processCmdLine sets the (root) logger level on --loglevel: a request must not
+        #   change the level of the long running server
+        loglevel = logger.level
+        try:
+            args, scnl_filter = processCmdLine(fname, argv)
+        finally:
+            logger.setLevel(loglevel)
+        if args.loglevel:
+            logger.error("--loglevel is not supported in yasmine-cli serve requests: set it when starting the server")
+            sys.exit(2)
+        logger.info("serve: [cmd: >%s]" % " ".join(argv))
+
+        if args.infiles is None and self.xml_list is None:
+            logger.error("No inventory loaded: start yasmine-cli serve with --infiles or pass --infiles")
+            sys.exit(2)
+        if args.plot_resp or args.check_responses or args.audit_epochs:
+            logger.error("--plot_resp/--check-responses/--audit-epochs are not supported by yasmine-cli serve")
+            sys.exit(2)
+
+        # --infiles replace the resident inventory, but only once the request succeeds
+        if args.infiles:
+            t0 = time.perf_counter()
+            resident, resident_schema_version = read_xml_list(args)
+            logger.info("serve: loaded infiles=%s in %.3f s" % (args.infiles, time.perf_counter() - t0))
+        else:
+            resident, resident_schema_version = self.xml_list, self.schema_version
+
+        xml_list = working_copy(resident)
+
+        if needs_epoch_order(args):
+            sort_epochs(xml_list)
+
+        if args.print_epochs or args.print_all:
+            print_all(xml_list, args, scnl_filter)
+            return None
+
+        apply_operations(xml_list, args, scnl_filter)
+
+        inv_new = pack_xml_list_to_inv(xml_list, merge=args.merge)
+        schema_version = args.schema_version if args.schema_version else resident_schema_version
+        validate = False if args.dont_validate else True
+
+        output = None
+        if args.output:
+            _write_stationxml(inv_new, args.output, validate=validate, schema_version=schema_version)
+        else:
+            buf = io.BytesIO()
+            _write_stationxml(inv_new, buf, validate=validate, schema_version=schema_version)
+            output = buf.getvalue().decode('utf-8')
+
+        if args.infiles:
+            self.xml_list, self.schema_version, self.load_args = resident, resident_schema_version, args
+        if not only_filters_output(args):
+            self.xml_list = xml_list
+
+        return output
+
+
+class YasmineRequestHandler(socketserver.StreamRequestHandler):
+    '''
+    Newline delimited json: one request per line --> one response per line
+    '''
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a json object")
+            except ValueError as e:
+                response = {'ok': False, 'errors': ["Invalid request: %s" % e]}
+            else:
+                response = self.server.dispatch(request)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+def serve(args):
+    '''
+    Run yasmine-cli serve until a shutdown request arrives
+
+    :param args: args.socket (path), args.infiles (optional) + options used to load them
+    :type args: class argparse.Namespace
+    '''
+    socket_path = args.socket if args.socket else default_socket()
+
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)      # stale socket left by a dead server
+            else:
+                logger.error("yasmine-cli serve is already running on socket:%s" % socket_path)
+                sys.exit(2)
+
+    server = YasmineServer(socket_path, args)
+    logger.info("serve: listening on socket:%s" % socket_path)
+    try:
+        while server.running:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    logger.info("serve: shutdown")
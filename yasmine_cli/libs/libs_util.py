@@ -33,6 +33,7 @@
 from sys import exit
 import argparse
 import os
+import re
 import sys
 import yaml
 
@@ -41,11 +42,13 @@ from .. import installation_dir, yml_template_dir
 import logging
 logger = logging.getLogger()
 
-from .libs_obs import read_yml_file, show_fields, check_field
 from .libs_log import string_to_logLevel
+from .libs_cache import InventoryCache, CACHE_SIZE
 
 list_fields = {'comments', 'equipments', 'identifiers', 'operators', 'types', 'external_references'}
 root_fields = {'source', 'sender', 'module', 'module_uri'}
+# A single code within a --level_xxx SNCL pattern (see valid_code_pattern)
+code_pattern_re = re.compile(r'^[A-Za-z0-9*?!\[\]]+$')
 
 TEMPLATE_DIR = yml_template_dir()
 
@@ -99,7 +102,22 @@ def pick_off_configFile(argv):
             foo, configFile = word.split('--configFile=')
     return configFile
 
-def processCmdLine(fname):
+# --merge: how to resolve station epochs/networks with the same key but different contents across --infiles
+MERGE_POLICIES = ['first-wins', 'last-wins', 'error']
+
+def processCmdLine(fname, argv=None):
+    '''
+    Parse command line options into args + scnl_filter
+
+    :param fname: Name of calling program (used in messages)
+    :type fname: str
+
+    :param argv: List of cmd line options [default=sys.argv[1:]]
+    :type argv: list
+    '''
+
+    if argv is None:
+        argv = sys.argv[1:]
 
     epilog='''
 Examples:
@@ -128,6 +146,8 @@ Examples:
     cgroup = parser.add_argument_group('epoch options: Use to filter down to epoch level')
     cgroup.add_argument("--epoch_station", type=int, metavar='int', help="station epoch index to filter on, eg, --epoch_station=1")
     cgroup.add_argument("--epoch_channel", type=int, metavar='int', help="channel epoch index to filter on, eg, --epoch_channel=0")
+    cgroup.add_argument("--starttime", type=str, metavar='time', help="only act on epochs that end at/after starttime, eg, --starttime=2010-01-01")
+    cgroup.add_argument("--endtime", type=str, metavar='time', help="only act on epochs that start at/before endtime, eg, --endtime=2012-01-01T12:00:00")
 
     dgroup = parser.add_argument_group('build options')
     dgroup.add_argument("--field", type=str, help='field, key or attribute to update. eg, --field=Latitude or --field=comments[1]')
@@ -149,15 +169,30 @@ Examples:
     optional.add_argument('--plot_resp', help='Plot all channel responses', action="store_true")
     optional.add_argument('--plot_dir', type=str, metavar='path', help='Path to dir to save plot responses')
     optional.add_argument('--loglevel', type=str, metavar='log level', help='loglevel in {DEBUG, INFO, WARN, etc}')
+    optional.add_argument('--lazy_responses', help='Only parse channel responses when used: untouched responses are copied through verbatim', action="store_true")
+    optional.add_argument('--passthrough', help='Copy networks/stations that were not modified from the input xml to output untouched', action="store_true")
+    optional.add_argument('--batch', type=str, metavar='ops.yml', help='Apply the ordered list of operations in ops.yml in a single load/write cycle')
+    optional.add_argument('--cache', help='Cache parsed input files on disk: unchanged files skip xml parsing on later runs', action="store_true")
+    optional.add_argument('--no-cache', dest='no_cache', help='Turn OFF the cache (overrides --cache/--cache_dir)', action="store_true")
+    optional.add_argument('--clear-cache', dest='clear_cache', help='Remove all entries from the cache and exit', action="store_true")
+    optional.add_argument('--cache_dir', type=str, metavar='path', help='Cache directory (implies --cache) [default=~/.cache/yasmine]')
+    optional.add_argument('--cache_size', type=int, default=CACHE_SIZE, metavar='MB', help='Max size of the cache, least recently used entries are evicted [default=%d MB]' % CACHE_SIZE)
+    optional.add_argument('--jobs', type=int, default=1, metavar='N', help='Number of worker processes used to load --infiles/--plot_resp [default=1, 0=one per cpu]')
+    optional.add_argument('--serial', help='Ignore --jobs and do everything serially (for debugging)', action="store_true")
+    optional.add_argument('--merge', type=str, default='first-wins', choices=MERGE_POLICIES, help='How to resolve station epochs/networks that differ between --infiles [default=first-wins]')
+    optional.add_argument('--audit-epochs', dest='audit_epochs', nargs='?', const='-', metavar='report.csv|report.json', help='Report every overlap, gap and unclosed station/channel epoch instead of writing xml [default=csv to stdout]')
+    optional.add_argument('--check-responses', dest='check_responses', nargs='?', const='-', metavar='report.csv|report.json', help='Check computed vs reported sensitivity of every channel response and write a report instead of xml [default=csv to stdout]')
+    optional.add_argument('--sensitivity_tolerance', type=float, metavar='frac', help='Max relative sensitivity difference before --check-responses flags a channel [default=0.05]')
+    optional.add_argument('--socket', type=str, metavar='path', help='Unix socket of yasmine-cli serve [default=$XDG_RUNTIME_DIR/yasmine-cli.sock]')
 
     # Intercept the help msg so we can also print examples after
-    if len(sys.argv) == 1 or \
-       (len(sys.argv) == 2 and (sys.argv[1] == '-h' or sys.argv[1] == '--help')):
+    if len(argv) == 0 or \
+       (len(argv) == 1 and (argv[0] == '-h' or argv[0] == '--help')):
         parser.print_help()
         print(epilog)
         exit()
 
-    args, unknown = parser.parse_known_args()
+    args, unknown = parser.parse_known_args(argv)
 
     if unknown:
         logger.error("The following cmd line params are unknown:%s" %(" ".join(unknown)))
@@ -166,12 +201,34 @@ Examples:
 
 
     if args.show_fields or getattr(args, 'show-fields', None):
+        from .libs_obs import show_fields
         show_fields()
         exit()
 
     if args.loglevel:
         logger.setLevel(string_to_logLevel(args.loglevel))
 
+    if args.clear_cache:
+        InventoryCache(args.cache_dir).clear()
+        exit()
+
+    # Everything past here builds/checks obspy objects: import obspy only now so that
+    #   --help, --show_fields, --clear-cache don't pay for it
+    from .libs_obs import read_yml_file, check_field
+
+    args.inventory_cache = None
+    if (args.cache or args.cache_dir) and not args.no_cache:
+        args.inventory_cache = InventoryCache(args.cache_dir, args.cache_size)
+
+
+    if args.batch:
+        if args.action or args.field or args.value or args.from_yml or \
+           args.level_network or args.level_station or args.level_channel:
+            logger.error("--batch can't be combined with --action/--field/--value/--from_yml/--level_xxx: "
+                         "put these in the operations of the batch file instead")
+            exit(2)
+        args.action = 'batch'
+        args.batch_ops = read_batch_file(fname, args.batch)
 
 # If no action set and we're not simpling printing out,
 #  the action is either 'update' or 'select':
@@ -394,7 +451,8 @@ Examples:
     elif args.action == 'delete':
         logger.info("Use delete to delete a basenode")
 
-    scnl_filter = struct(NET=None, STA=None, CHA=None, LOC=None, STN_EPOCH=None, CHN_EPOCH=None, INDEX=None)
+    scnl_filter = struct(NET=None, STA=None, CHA=None, LOC=None, STN_EPOCH=None, CHN_EPOCH=None, INDEX=None,
+                         STARTTIME=None, ENDTIME=None)
 
     if args.use_index:
         scnl_filter.INDEX = args.field_index
@@ -405,70 +463,71 @@ Examples:
         level = 'network'
         if args.level_network == '*':
             net = None
-        elif args.level_network.isalnum() and len(args.level_network) > 0 :
+        elif valid_code_pattern(args.level_network):
             net = args.level_network
         else:
             parser.print_usage()
             logger.info("Example: --level_network=IU")
+            logger.info("Example: --level_network=IU,II  or  --level_network=X?")
             exit(2)
         scnl_filter.NET = net
     elif args.level_station:
         level = 'station'
         fail = False
-        if args.level_station.isalnum():
+        if '.' not in args.level_station:
             sta = args.level_station
             net = None
+            if sta == '*':
+                sta = None
+            elif not valid_code_pattern(sta):
+                fail = True
         else:
             try:
                 (tmp_net, tmp_sta) = args.level_station.split(".")
 
-                if tmp_net.isalnum():
-                    net = tmp_net
-                elif tmp_net == '*':
+                if tmp_net == '*':
                     net = None
+                elif valid_code_pattern(tmp_net):
+                    net = tmp_net
                 else:
                     fail = True
 
-                if tmp_sta.isalnum():
-                    sta = tmp_sta
-                elif tmp_sta == '*':
+                if tmp_sta == '*':
                     sta = None
+                elif valid_code_pattern(tmp_sta):
+                    sta = tmp_sta
                 else:
                     fail = True
-            except:
-                logger.error("Unable to split net.sta")
-                logger.info("Example: --level_station=ANMO    // Act on station(s)=ANMO of net=*")
-                logger.info("Example: --level_station=*.ANMO  // Act on station(s)=ANMO of net=*")
-                logger.info("Example: --level_station=IU.ANMO // Act on station(s)=ANMO of net=IU")
-                logger.info("Example: --level_station=IU.*    // Act on station(s)=*    of net=IU")
-                parser.print_usage()
-                exit(2)
+            except ValueError:
+                fail = True
+
+        if fail:
+            logger.error("Unable to parse --level_station=%s as net.sta" % args.level_station)
+            logger.info("Example: --level_station=ANMO    // Act on station(s)=ANMO of net=*")
+            logger.info("Example: --level_station=*.ANMO  // Act on station(s)=ANMO of net=*")
+            logger.info("Example: --level_station=IU.ANMO // Act on station(s)=ANMO of net=IU")
+            logger.info("Example: --level_station=IU.*    // Act on station(s)=*    of net=IU")
+            logger.info("Example: --level_station=IU.A*,CCM // Act on station(s)=A* + CCM of net=IU")
+            parser.print_usage()
+            exit(2)
 
         scnl_filter.NET = net
         scnl_filter.STA = sta
 
     elif args.level_channel:
         level = 'channel'
-        fail = False
-        try:
-            (fields) = args.level_channel.split(".")
-        except:
-            #print("Unable to split net.sta")
-            fail = True
-
-        if len(fields) != 4:
-            fail = True
-        else:
-            for field in fields:
-                if not field.isalnum() and field != '*' and field != '--':
-
-                    logger.info("Example: --level_channel=IU.ANMO.00.BHZ // Act on channel(s)=BHZ of loc=00 of sta=ANMO of net=IU")
-                    logger.info("Example: --level_channel=IU.ANMO.00.*   // Act on channel(s)=*   of loc=00 of sta=ANMO of net=IU")
-                    logger.info("Example: --level_channel=IU.ANMO.*.*    // Act on channel(s)=*   of loc=*  of sta=ANMO of net=IU")
-                    logger.info("Example: --level_channel=IU.*.*.*       // Act on channel(s)=*   of loc=*  of sta=*    of net=IU")
-                    logger.info("Example: --level_channel=*.*.*.BHZ      // Act on channel(s)=BHZ of loc=*  of sta=*    of net=*")
-                    parser.print_usage()
-                    exit(2)
+        fields = args.level_channel.split(".")
+
+        if len(fields) != 4 or not all(field == '*' or valid_code_pattern(field) for field in fields):
+            logger.info("Example: --level_channel=IU.ANMO.00.BHZ // Act on channel(s)=BHZ of loc=00 of sta=ANMO of net=IU")
+            logger.info("Example: --level_channel=IU.ANMO.00.*   // Act on channel(s)=*   of loc=00 of sta=ANMO of net=IU")
+            logger.info("Example: --level_channel=IU.ANMO.*.*    // Act on channel(s)=*   of loc=*  of sta=ANMO of net=IU")
+            logger.info("Example: --level_channel=IU.*.*.*       // Act on channel(s)=*   of loc=*  of sta=*    of net=IU")
+            logger.info("Example: --level_channel=*.*.*.BHZ      // Act on channel(s)=BHZ of loc=*  of sta=*    of net=*")
+            logger.info("Example: --level_channel=IU.*.00,10.BH? // Act on channel(s)=BH? of loc=00,10 of sta=* of net=IU")
+            logger.info("Example: --level_channel=IU.*.--.[EH]H[ZNE] // Act on channel(s)=EHZ,HHN,.. of loc='' of sta=* of net=IU")
+            parser.print_usage()
+            exit(2)
 
         (net, sta, loc, cha) = tuple(fields)
 
@@ -490,8 +549,129 @@ Examples:
     if args.epoch_station is not None:
         scnl_filter.STN_EPOCH = args.epoch_station
 
+    # Time window (in microseconds, see libs_epoch)
+    for option in ['starttime', 'endtime']:
+        value = getattr(args, option)
+        if value is None:
+            continue
+        from obspy import UTCDateTime
+        from .libs_epoch import to_ticks
+        try:
+            setattr(scnl_filter, option.upper(), to_ticks(UTCDateTime(value)))
+        except (TypeError, ValueError) as e:
+            logger.error("Unable to parse --%s=%s Caught:%s" % (option, value, repr(e)))
+            parser.print_usage()
+            exit(2)
+    if scnl_filter.STARTTIME is not None and scnl_filter.ENDTIME is not None and \
+       scnl_filter.STARTTIME > scnl_filter.ENDTIME:
+        logger.error("--starttime=%s is after --endtime=%s" % (args.starttime, args.endtime))
+        exit(2)
+
     return args, scnl_filter
 
+# Cmd line options that can be set within each operation of a --batch file
+batch_op_options = ['action', 'level_network', 'level_station', 'level_channel',
+                    'epoch_station', 'epoch_channel', 'starttime', 'endtime', 'field', 'value', 'from_yml']
+
+def read_batch_file(fname, batchfile):
+    '''
+    Read the ordered list of operations in a --batch yml file, e.g.,
+
+        operations:
+          - level_station: '*.ANMO'
+            field: code
+            value: MIKE
+          - level_station: '*.CCM'
+            field: latitude
+            value: 33.77
+          - action: delete
+            level_channel: 'IU.ANMO.10.*'
+
+    Each operation is a dict of the cmd line options in batch_op_options and
+        is parsed exactly like the equivalent yasmine-cli cmd line would be.
+
+    :param fname: Name of calling program (used in messages)
+    :type fname: str
+
+    :param batchfile: Path to batch yml file
+    :type batchfile: str
+
+    :returns: list of (args, scnl_filter), one per operation
+    :rtype: list
+    '''
+
+    try:
+        with open(batchfile, 'r') as ymlfile:
+            cfg = yaml.load(ymlfile, Loader=yaml.FullLoader)
+    except (IOError, yaml.YAMLError) as e:
+        logger.error("Unable to read --batch file:%s Caught:%s" % (batchfile, repr(e)))
+        exit(2)
+
+    if not isinstance(cfg, dict) or not isinstance(cfg.get('operations'), list):
+        logger.error("--batch file:%s must contain a list of 'operations:'" % batchfile)
+        exit(2)
+
+    batch_ops = []
+    for i, op in enumerate(cfg['operations']):
+        if not op or not isinstance(op, dict):
+            logger.error("--batch file:%s operation[%d] is empty" % (batchfile, i))
+            exit(2)
+        unknown = [key for key in op if key not in batch_op_options]
+        if unknown:
+            logger.error("--batch file:%s operation[%d] has unknown option(s):%s (allowed:%s)" %
+                         (batchfile, i, unknown, batch_op_options))
+            exit(2)
+
+        argv = op_to_argv(op)
+        logger.info("--batch operation[%d]: %s" % (i, " ".join(argv)))
+        try:
+            batch_ops.append(processCmdLine(fname, argv=argv))
+        except SystemExit:
+            logger.error("--batch file:%s operation[%d] is not valid" % (batchfile, i))
+            raise
+
+    return batch_ops
+
+
+def op_to_argv(op):
+    '''
+    Convert one operation dict, e.g., {'level_station': '*.ANMO', 'field': 'code', 'value': 'MIKE'}
+        into the equivalent list of cmd line options: ['--level_station=*.ANMO', '--field=code', '--value=MIKE']
+
+    :param op: Operation as a dict of {option: value}
+    :type op: dict
+
+    :returns: cmd line options
+    :rtype: list
+    '''
+    argv = []
+    for key, value in op.items():
+        if isinstance(value, list):
+            value = '[%s]' % ','.join(str(item) for item in value)
+        argv.append('--%s=%s' % (key, value))
+    return argv
+
+
+def valid_code_pattern(pattern):
+    """
+    Check that pattern is a usable SNCL code pattern
+        = comma separated list of codes made of alphanumerics and
+          the wildcards *, ?, [..] (see libs_index.CodeMatcher)
+          '--' can be used for the empty location code
+
+    :param pattern: e.g., 'ANMO', 'BH?', '00,10', '[EH]H[ZNE]'
+    :type pattern: str
+
+    :returns: True if pattern is valid
+    :rtype: bool
+    """
+    for code in pattern.split(','):
+        if code == '--':
+            continue
+        if not code or not code_pattern_re.match(code):
+            return False
+    return True
+
 def list_str(values):
     return values.split(',')
 
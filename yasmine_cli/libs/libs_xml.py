@@ -48,11 +48,11 @@ def valid_xmlfiles(args):
     if not args.dont_validate:           # Check for valid StationXML
         for xmlfile in args.infiles:
             schema_version = get_schema_version(xmlfile)
-            schema_file = 'fdsn-schema/fdsn-station-%s.xsd' % schema_version
-            logger.info("Check file:%s against schema_file:%s" % (xmlfile, schema_file))
+            xsd_file = schema_file(schema_version)
+            logger.info("Check file:%s against schema_file:%s" % (xmlfile, xsd_file))
             #valid, errors = validate_stationxml(BytesIO(contents), schemafile)
             #valid, errors = validate_stationxml(xmlfile, schemafile)
-            valid, errors = validate_stationxml(xmlfile, schema_file)
+            valid, errors = validate_stationxml(xmlfile, xsd_file)
 
             if not valid:
                 for error in errors:
@@ -62,14 +62,78 @@ def valid_xmlfiles(args):
     return True
 
 
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
 from lxml import etree
 
+from .. import fdsn_schema_dir
+
+# Process-wide registry of compiled XSD schemas:
+#   key = (schema file of schema_version, mtime of schema file) --> etree.XMLSchema
+_schema_registry = {}
+_schema_lock = threading.Lock()
+# lxml keeps the errors of each validate() run on the (shared) schema object itself
+#   (xmlschema.error_log): validate() + reading its error_log must not interleave
+#   if validate_stationxml is called from several threads
+_validate_lock = threading.Lock()
+
+def schema_file(schema_version):
+    """
+    Return the path to the FDSN StationXML schema file for schema_version
+
+    :param schema_version: StationXML schema version, e.g., '1.0' or '1.1'
+    :type schema_version: str
+
+    :returns: path to fdsn-station-<schema_version>.xsd
+    :rtype: str
+    """
+    return os.path.join(fdsn_schema_dir(), 'fdsn-station-%s.xsd' % schema_version)
+
+
+def get_schema(schema_version=None, schemafile=None):
+    """
+    Return the compiled XMLSchema for schema_version (or explicit schemafile)
+
+        Compiling fdsn-station-x.x.xsd is by far the most expensive part of
+        validating a file, so compiled schemas are kept in a process-wide
+        registry keyed by the schema file of each version + its mtime.
+        If the schema file is modified on disk it will be recompiled.
+
+    :param schema_version: StationXML schema version, e.g., '1.0' or '1.1'
+    :type schema_version: str
+
+    :param schemafile: Path to xsd file [default=schema_file(schema_version)]
+    :type schemafile: str
+
+    :returns: compiled schema
+    :rtype: lxml.etree.XMLSchema
+    """
+
+    if schemafile is None:
+        schemafile = schema_file(schema_version)
+
+    key = (os.path.abspath(schemafile), os.path.getmtime(schemafile))
+
+    with _schema_lock:
+        xmlschema = _schema_registry.get(key)
+        if xmlschema is None:
+            logger.debug("get_schema: compile schema_file:%s" % schemafile)
+            xmlschema = etree.XMLSchema(etree.parse(schemafile))
+            _schema_registry[key] = xmlschema
+
+    return xmlschema
+
+
 def validate_stationxml(path_or_object, schemafile):
 
     try:
-      xmlschema = etree.XMLSchema(etree.parse(schemafile))
+      xmlschema = get_schema(schemafile=schemafile)
 
-      if isinstance(path_or_object, etree._Element):
+      if isinstance(path_or_object, (etree._Element, etree._ElementTree)):
           xmldoc = path_or_object
       else:
           try:
@@ -80,15 +144,141 @@ def validate_stationxml(path_or_object, schemafile):
     except:
         raise
 
-    valid = xmlschema.validate(xmldoc)
+    # The (shared) schema holds the error_log of its last validate() run
+    with _validate_lock:
+        valid = xmlschema.validate(xmldoc)
+        error_log = xmlschema.error_log
 
     # Pretty error printing if the validation fails.
     if valid is not True:
-        return (False, xmlschema.error_log)
+        return (False, error_log)
 
     return (True, ())
 
 
+def validate_xmlfiles(xmlfiles, schema_version):
+    """
+    Validate every file in xmlfiles against schema_version
+
+        All files are checked, rather than stopping at the first bad one, and
+        the results are returned as a single report. Files are validated one
+        after the other against the (one) compiled schema: --jobs N validates
+        across worker processes instead (see load_validate_xmlfiles).
+
+    :param xmlfiles: List of paths -or- ingested xml_docs (see read_xmlfile)
+    :type xmlfiles: list
+
+    :param schema_version: StationXML schema version to validate against
+    :type schema_version: str
+
+    :returns: report = list of dicts, one per file in input order,
+              with keys 'xmlfile', 'schema_version', 'valid', 'errors'
+    :rtype: list
+    """
+
+    xsd_file = schema_file(schema_version)
+
+    def _validate(xml_doc):
+        if isinstance(xml_doc, dict):
+            xmlfile = xml_doc['xmlfile']
+            xmldoc = xml_doc['tree']
+        else:
+            xmlfile = xmldoc = xml_doc
+        logger.info("Check file:%s against schema_file:%s" % (xmlfile, xsd_file))
+        valid, errors = validate_stationxml(xmldoc, xsd_file)
+        return {'xmlfile': xmlfile, 'schema_version': schema_version,
+                'valid': valid, 'errors': [str(error) for error in errors]}
+
+    return [_validate(xml_doc) for xml_doc in xmlfiles]
+
+
+def log_validation_report(report):
+    """
+    Log the report returned by validate_xmlfiles
+
+    :param report: List of per-file validation results
+    :type report: list
+
+    :returns: True if all files are valid
+    :rtype: bool
+    """
+
+    failed = [result for result in report if not result['valid']]
+
+    logger.info("Validation report: %d file(s) checked, %d failed" % (len(report), len(failed)))
+    for result in failed:
+        logger.error("File:%s does not validate against schema version:[%s]" % \
+                     (result['xmlfile'], result['schema_version']))
+        for error in result['errors']:
+            logger.error("    %s" % error)
+
+    return len(failed) == 0
+
+
+# stdin is held in memory up to this size (bytes) before being spooled to an
+#   anonymous temp file (removed on close or exit)
+STDIN_SPOOL_SIZE = 64 * 1024 * 1024
+STDIN_NAME = '<stdin>'
+
+def read_stdin(stream=None, max_size=STDIN_SPOOL_SIZE):
+    '''
+    Read stdin (as bytes) into a buffer that can be sniffed + parsed directly
+
+    :param stream: Binary stream to read [default=sys.stdin.buffer]
+    :type stream: file-like object
+
+    :param max_size: Size (bytes) above which the buffer is spooled to disk
+    :type max_size: int
+
+    :returns: buffer rewound to the start. Caller must close it.
+    :rtype: tempfile.SpooledTemporaryFile
+    '''
+    if stream is None:
+        stream = sys.stdin.buffer
+
+    buf = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+    shutil.copyfileobj(stream, buf)
+    buf.seek(0)
+
+    return buf
+
+
+def read_xmlfile(xmlfile, schema_version=None, name=None):
+    """
+    Ingest an xml file: read it once and build a single lxml tree
+
+        The returned tree is shared by everything downstream (schema version
+        check, schema validation and Inventory construction) so that each
+        input file is only parsed one time.
+
+    :param xmlfile: Path (or file-like object) of StationXML file
+    :type xmlfile: str
+
+    :param schema_version: Version already sniffed from xmlfile (if known)
+    :type schema_version: str
+
+    :param name: Name used to report xmlfile (e.g., STDIN_NAME) [default=xmlfile]
+    :type name: str
+
+    :returns: dict with keys 'xmlfile', 'tree', 'schema_version' or None if
+              xmlfile could not be parsed
+    :rtype: dict
+    """
+
+    try:
+        tree = etree.parse(xmlfile)
+    except (etree.XMLSyntaxError, OSError) as e:
+        logger.error("file=[%s] is NOT a XML file! Caught:%s" % (name if name else xmlfile, repr(e)))
+        return None
+
+    xml_doc = {}
+    xml_doc['xmlfile'] = name if name else xmlfile
+    xml_doc['tree'] = tree
+    xml_doc['schema_version'] = schema_version if schema_version else get_schema_version(tree)
+
+    return xml_doc
+
+
 import errno
 #def validate_files(xmlfiles):
 def check_files(xmlfiles):
@@ -116,23 +306,72 @@ def check_files(xmlfiles):
 
 import xml.etree.ElementTree as ET
 #from lxml import etree as ET
+
+SNIFF_CHUNK_SIZE = 4096
+
 def get_schema_version(xmlfile_or_string):
+    """
+    Sniff the schemaVersion attribute of <FDSNStationXML>
 
-    namespace = "http://www.fdsn.org/xml/station/1"
+        Only the root element is needed, so rather than building a tree of the
+        whole document, the input is fed in small chunks to a pull parser that
+        stops at the first start event.  Time + memory are constant regardless
+        of file size.
+
+    :param xmlfile_or_string: path, xml bytes/string, file-like object
+                              or already parsed lxml tree/element
+    :type xmlfile_or_string: str, bytes, file-like, lxml.etree._ElementTree
+
+    :returns: schema version (e.g., '1.1') or None if it can't be determined
+    :rtype: str
+    """
+
+    # Already parsed (see read_xmlfile)
+    if isinstance(xmlfile_or_string, etree._ElementTree):
+        return xmlfile_or_string.getroot().attrib.get('schemaVersion')
+    if isinstance(xmlfile_or_string, etree._Element):
+        return xmlfile_or_string.attrib.get('schemaVersion')
+
+    if isinstance(xmlfile_or_string, str) and xmlfile_or_string.lstrip().startswith('<'):
+        xmlfile_or_string = xmlfile_or_string.encode('utf-8')
+
+    parser = etree.XMLPullParser(events=('start',))
+
+    def _read_chunks(f):
+        while True:
+            chunk = f.read(SNIFF_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+    def _sniff(chunks):
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                return element.attrib.get('schemaVersion')
+        return None
 
-    root = None
     try:
-        # parse an xmlfile
-        tree = ET.parse(xmlfile_or_string)
-        root = tree.getroot()
-    except:
-        # parse an xml string
-        root = ET.fromstring(xmlfile_or_string)
-    if root is not None:
-        stationxml_version = root.attrib.get('schemaVersion')
-        return stationxml_version
-    else:
-        logger.ERROR("Unable to parse xmlfile_or_string")
+        # Fast path for in-memory input (e.g., stdin buffer): no copy is made
+        if isinstance(xmlfile_or_string, (bytes, bytearray, memoryview)):
+            buf = memoryview(xmlfile_or_string)
+            return _sniff(buf[i:i+SNIFF_CHUNK_SIZE].tobytes()
+                          for i in range(0, len(buf), SNIFF_CHUNK_SIZE))
+
+        # File-like object: rewind to where we started (if we can)
+        if hasattr(xmlfile_or_string, 'read'):
+            pos = xmlfile_or_string.tell() if xmlfile_or_string.seekable() else None
+            try:
+                return _sniff(_read_chunks(xmlfile_or_string))
+            finally:
+                if pos is not None:
+                    xmlfile_or_string.seek(pos)
+
+        with open(xmlfile_or_string, 'rb') as f:
+            return _sniff(_read_chunks(f))
+
+    except (etree.XMLSyntaxError, OSError) as e:
+        logger.error("Unable to parse xmlfile_or_string: %s" % repr(e))
         return None
 
 
@@ -1,12 +1,120 @@
 
 from obspy.core.inventory.response import PolynomialResponseStage, InstrumentPolynomial
-import matplotlib.pyplot as plt
 import os
 import numpy as np
+from numpy.polynomial import polynomial as P
 
 import logging
 logger = logging.getLogger()
 
+def evaluate_polynomial(coefficients, x, lower_bound=None, upper_bound=None):
+    """
+    Evaluate a (MacLaurin) polynomial response y = sum(c[i] * x**i) on an array of x's,
+        keeping only the points where y is within the approximation bounds
+
+    :param coefficients: polynomial coefficients c[0], c[1], ...
+    :type coefficients: list
+
+    :param x: values to evaluate the polynomial at (e.g., volts or counts)
+    :type x: numpy.ndarray
+
+    :returns: y (e.g., temps) -and- the x's they came from, both masked to the approximation bounds
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+    x = np.asarray(x, dtype=float)
+    y = P.polyval(x, np.asarray(coefficients, dtype=float))
+    mask = np.ones(y.shape, dtype=bool)
+    if lower_bound is not None:
+        mask &= y >= lower_bound
+    if upper_bound is not None:
+        mask &= y <= upper_bound
+    return y[mask], x[mask]
+
+
+def is_polynomial_resp(response):
+    """
+    True if response has an InstrumentPolynomial + starts with a PolynomialResponseStage
+    """
+    return bool(response.instrument_polynomial and response.response_stages and
+                isinstance(response.response_stages[0], PolynomialResponseStage))
+
+
+def net_gain(response):
+    """
+    Product of all stage gains: used to scale between Volts and Counts
+    """
+    gain = 1.
+    for stage in response.response_stages:
+        if stage.stage_gain:
+            gain *= stage.stage_gain
+    return gain
+
+
+def evaluate_polynomial_resp(response, vmin=-20., vmax=20., dv=0.10):
+    """
+    Evaluate both polynomials of a polynomial response (no plotting) over volts = vmin:vmax:dv
+
+        x1, y1: input (e.g., degC) vs volts from the PolynomialResponseStage (first stage)
+        x2, y2: input (e.g., degC) vs counts (= volts * net gain) from the InstrumentPolynomial
+
+    :param response: channel polynomial response
+    :type response: ObsPy response object
+
+    :returns: x1, y1, x2, y2 -or- None if response is not a polynomial response
+    :rtype: numpy.ndarray x 4
+    """
+    if not is_polynomial_resp(response):
+        return None
+
+    # MTH: We need a min/max in the *output* space (e.g., volts) to step through
+    #      Otherwise we'll be calculating wild values out of range
+    #      Add a little bit to vmax to it gets included in the array
+    volts = np.arange(vmin, vmax+dv/10., dv)
+
+    # x=temp = f(y=volts) // the measured thing might not be "temp", it doesn't matter
+    poly = response.response_stages[0]
+    x1, y1 = evaluate_polynomial(poly.coefficients, volts,
+                                 poly.approximation_lower_bound, poly.approximation_upper_bound)
+
+    # x=temp = f(y=counts)
+    poly = response.instrument_polynomial
+    x2, y2 = evaluate_polynomial(poly.coefficients, volts * net_gain(response),
+                                 poly.approximation_lower_bound, poly.approximation_upper_bound)
+
+    return x1, y1, x2, y2
+
+
+def polynomial_gain_mismatch(response, vmin=-20., vmax=20., dv=0.10):
+    """
+    Check that the InstrumentPolynomial is consistent with the PolynomialResponseStage + stage gains:
+        For the same volts, both should give the same input (e.g., temp)
+
+    :returns: max relative difference between the two over the volts where both are within bounds
+              -or- None if response is not a polynomial response
+    :rtype: float
+    """
+    if not is_polynomial_resp(response):
+        return None
+
+    volts = np.arange(vmin, vmax+dv/10., dv)
+    stage = response.response_stages[0]
+    poly = response.instrument_polynomial
+    x1 = P.polyval(volts, np.asarray(stage.coefficients, dtype=float))
+    x2 = P.polyval(volts * net_gain(response), np.asarray(poly.coefficients, dtype=float))
+
+    mask = np.ones(volts.shape, dtype=bool)
+    for p, x in ((stage, x1), (poly, x2)):
+        if p.approximation_lower_bound is not None:
+            mask &= x >= p.approximation_lower_bound
+        if p.approximation_upper_bound is not None:
+            mask &= x <= p.approximation_upper_bound
+    if not mask.any():
+        return 0.
+
+    scale = max(np.abs(x1[mask]).max(), np.finfo(float).tiny)
+    return float(np.abs(x1[mask] - x2[mask]).max() / scale)
+
+
 def plot_polynomial_resp(response, label=None, axes=None, outfile=None,
                          vmin=-20., vmax=20., dv=0.10):
     """
@@ -31,8 +139,9 @@ def plot_polynomial_resp(response, label=None, axes=None, outfile=None,
          However, I left vmin/vmax/dv configurable in case a calling function wants
          to control this to limit plot range (somehow).
     """
+    import matplotlib.pyplot as plt
 
-    if not response.instrument_polynomial or not response.response_stages or not isinstance(response.response_stages[0], PolynomialResponseStage):
+    if not is_polynomial_resp(response):
         logger.error("plot_polynomial_resp: response does not contain instrument_polynomial "
                      "and/or PolynomialResponseStage")
         return None
@@ -43,48 +152,12 @@ def plot_polynomial_resp(response, label=None, axes=None, outfile=None,
     #file_path = os.path.join(folder, f'{sanitized_file_name}')
     #outfile = file_path
 
-    # We'll use the overall gain to scale between Volts and Counts
-    net_gain = 1.
-    for i, stage in enumerate(response.response_stages):
-        if stage.stage_gain:
-            net_gain *= stage.stage_gain
-
     poly = response.response_stages[0]
     xlabel = poly.input_units
     ylabel = poly.output_units
+    y2label = response.instrument_polynomial.output_units
 
-    # MTH: We need a min/max in the *output* space (e.g., volts) to step through
-    #      Otherwise we'll be calculating wild values out of range
-    #      Add a little bit to vmax to it gets included in the array
-    volts = np.arange(vmin, vmax+dv/10., dv)
-
-    # Load x=temp = f(y=volts) // the measured thing might not be "temp", it doesn't matter
-    x1 = []
-    y1 = []
-    for volt in volts:
-        temp = 0.
-        for i, c in enumerate(poly.coefficients):
-            temp += c * np.power(volt, i)
-        if temp >= poly.approximation_lower_bound and temp <= poly.approximation_upper_bound:
-            # print("V:%.3f     T:%.2f" % (volt, temp))
-            x1.append(temp)
-            y1.append(volt)
-
-    # Load x=temp = f(y=counts)
-    poly = response.instrument_polynomial
-    y2label = poly.output_units
-    x2 = []
-    y2 = []
-    print()
-    for volt in volts:
-        temp = 0.
-        count = volt * net_gain
-        for i, c in enumerate(poly.coefficients):
-            temp += c * np.power(count, i)
-        if temp >= poly.approximation_lower_bound and temp <= poly.approximation_upper_bound:
-            # print("C:%.3f     T:%.2f" % (count, temp))
-            x2.append(temp)
-            y2.append(count)
+    x1, y1, x2, y2 = evaluate_polynomial_resp(response, vmin=vmin, vmax=vmax, dv=dv)
 
     if axes:
         ax1, ax2 = axes
@@ -39,9 +39,9 @@ logger = logging.getLogger()
 from . import installation_dir
 
 from .libs.libs_log import configure_logger
-from .libs.libs_obs import _write_stationxml
 from .libs.libs_util import processCmdLine, read_config
-from .libs.edit_xml_to_inv import edit_xml_to_inv, plot_responses
+# obspy/lxml (libs_obs, edit_xml_to_inv) + matplotlib (plotting) are imported in main()
+#   only on the paths that use them
 
 def main():
     '''
@@ -52,8 +52,12 @@ def main():
                    [--value VALUE | --from_yml fname.yml] [--infiles] [-o]
                    [-p] [--print_all] [--dont_validate] [--schema_version ver]
                    [--show_fields] [--plot_resp] [--plot_dir path]
+                   [--audit-epochs [report.csv|report.json]]
+                   [--check-responses [report.csv|report.json]]
                    [--loglevel log level]
 
+           yasmine-cli serve [--socket path] [--infiles] [load options]
+
     See ../README.md or https://gitlab.isti.com/mhagerty/yasmine-cli
     for full docs
 
@@ -63,18 +67,43 @@ def main():
     config = read_config()
     configure_logger(config, logfile="%s.log" % fname)
 
+    # yasmine-cli serve [--socket=path] [--infiles=...]: keep inventory resident and accept
+    #   operations from yasmine-client over a unix socket
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from .libs.libs_serve import serve
+        from .yasmine_client import default_socket
+        argv = sys.argv[2:] if len(sys.argv) > 2 else ['--socket=%s' % default_socket()]
+        args, scnl_filter = processCmdLine('%s serve' % fname, argv)
+        serve(args)
+        return
+
     args, scnl_filter = processCmdLine(fname)
 
     logger.info("[cmd: >%s]" % " ".join(arg for arg in sys.argv))
     logger.info("NET:%s STA:%s LOC:%s CHA:%s" % (scnl_filter.NET, scnl_filter.STA, scnl_filter.LOC, scnl_filter.CHA))
     logger.info("level=[%s] action=[%s]" % (args.level, args.action))
 
+    from .libs.edit_xml_to_inv import edit_xml_to_inv
     inv_new, schema_version = edit_xml_to_inv(args, scnl_filter)
 
     if args.plot_resp:
-        plot_responses(inv_new, args.plot_dir)
+        from .libs.edit_xml_to_inv import plot_responses
+        plot_responses(inv_new, args.plot_dir, jobs=1 if args.serial else args.jobs)
+
+    elif args.audit_epochs:
+        from .libs.libs_audit import audit_epochs, write_audit
+        write_audit(audit_epochs(inv_new), None if args.audit_epochs == '-' else args.audit_epochs)
+
+    elif args.check_responses:
+        from .libs.libs_resp import check_responses, write_report
+        if args.sensitivity_tolerance is not None:
+            report = check_responses(inv_new, tolerance=args.sensitivity_tolerance)
+        else:
+            report = check_responses(inv_new)
+        write_report(report, None if args.check_responses == '-' else args.check_responses)
 
     else:
+        from .libs.libs_obs import _write_stationxml
         outfile = args.output if args.output else sys.stdout.buffer
         validate = False if args.dont_validate else True
 
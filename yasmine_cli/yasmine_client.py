@@ -0,0 +1,139 @@
+# ****************************************************************************
+  #
+  # This file is part of the yasmine editing tool.
+  #
+  # yasmine (Yet Another Station Metadata INformation Editor), a tool to
+  # create and edit station metadata information in FDSN stationXML format,
+  # is a common development of IRIS and RESIF.
+  # Development and addition of new features is shared and agreed between * IRIS and RESIF.
+  #
+  #
+  # Version 1.0 of the software was funded by SAGE, a major facility fully
+  # funded by the National Science Foundation (EAR-1261681-SAGE),
+  # development done by ISTI and led by IRIS Data Services.
+  # Version 2.0 of the software was funded by CNRS and development led by * RESIF.
+  #
+  # This program is free software; you can redistribute it
+  # and/or modify it under the terms of the GNU Lesser General Public
+  # License as published by the Free Software Foundation; either
+  # version 3 of the License, or (at your option) any later version. *
+  # This program is distributed in the hope that it will be
+  # useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+  # of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+  # GNU Lesser General Public License (GNU-LGPL) for more details. *
+  # You should have received a copy of the GNU Lesser General Public
+  # License along with this software. If not, see
+  # <https://www.gnu.org/licenses/>
+  #
+  #
+  # 2019/10/07 : version 2.0.0 initial commit
+  #
+  # ****************************************************************************/
+
+import json
+import os
+import socket
+import sys
+
+# Thin client for yasmine-cli serve: stdlib only, so that it starts up in a few ms
+#   (it must *not* import obspy/lxml/matplotlib or anything in yasmine_cli.libs)
+
+SOCKET_NAME = 'yasmine-cli.sock'
+
+def default_socket():
+    '''
+    Default path of the yasmine-cli serve socket:
+        $XDG_RUNTIME_DIR/yasmine-cli.sock -or- /tmp/yasmine-cli-<uid>.sock
+
+    :returns: path to socket
+    :rtype: str
+    '''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join('/tmp', 'yasmine-cli-%d.sock' % os.getuid())
+
+
+def send_request(request, socket_path=None):
+    '''
+    Send one request to a running yasmine-cli serve and return its response
+
+    :param request: e.g., {'command': 'edit', 'argv': ['--level_station=*.ANMO', '--field=code', '--value=MIKE']}
+    :type request: dict
+
+    :param socket_path: Path to serve socket [default=default_socket()]
+    :type socket_path: str
+
+    :returns: response, e.g., {'ok': True, 'output': '<?xml ...', 'stdout': '', 'stderr': '', 'errors': []}
+    :rtype: dict
+    '''
+    if socket_path is None:
+        socket_path = default_socket()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+
+    if not line:
+        return {'ok': False, 'errors': ['No response from server at %s' % socket_path]}
+    return json.loads(line.decode('utf-8'))
+
+
+def main():
+    '''
+    usage: yasmine-client [--socket=path] [ping | reload | shutdown]
+           yasmine-client [--socket=path] [yasmine-cli options ...]
+
+    Any yasmine-cli options are applied to the inventory held by yasmine-cli serve.
+        The modified StationXML is written to stdout (or to -o/--output) exactly like yasmine-cli.
+    '''
+
+    argv = sys.argv[1:]
+
+    socket_path = os.environ.get('YASMINE_SOCKET')
+    options = []
+    i = 0
+    while i < len(argv):
+        if argv[i].startswith('--socket='):
+            socket_path = argv[i].split('=', 1)[1]
+        elif argv[i] == '--socket' and i + 1 < len(argv):
+            i += 1
+            socket_path = argv[i]
+        else:
+            options.append(argv[i])
+        i += 1
+
+    if len(options) == 1 and options[0] in ('ping', 'reload', 'shutdown'):
+        request = {'command': options[0]}
+    else:
+        # Relative paths (--infiles, -o, --from_yml, ...) are relative to our cwd, not the server's
+        request = {'command': 'edit', 'argv': options, 'cwd': os.getcwd()}
+
+    try:
+        response = send_request(request, socket_path)
+    except (OSError, ValueError) as e:
+        sys.stderr.write("yasmine-client: unable to reach yasmine-cli serve at %s: %s\n" %
+                         (socket_path if socket_path else default_socket(), e))
+        sys.exit(2)
+
+    if response.get('stdout'):
+        sys.stdout.write(response['stdout'])
+    if response.get('output'):
+        sys.stdout.buffer.write(response['output'].encode('utf-8'))
+    sys.stdout.flush()
+
+    if response.get('stderr'):
+        sys.stderr.write(response['stderr'])
+    for msg in response.get('errors', []):
+        sys.stderr.write("%s\n" % msg)
+
+    if not response.get('ok'):
+        sys.exit(2)
+
+    return
+
+
+if __name__ == "__main__":
+    main()